@@ -13,12 +13,75 @@ import functools
 from pathlib import Path
 import bpy.utils.previews
 import concurrent.futures
-from functools import partial
 import random
-
-
-preview_collections = {}
-loaded_categories = set()
+import json
+import re
+import queue
+import itertools
+import zlib
+import hashlib
+import threading
+import time
+import math
+from mathutils import Matrix
+from collections import deque, OrderedDict, defaultdict, namedtuple
+
+try:
+    import cghood_tools
+except ImportError:
+    cghood_tools = None
+
+
+preview_collections = OrderedDict()
+preview_icon_ids = {}
+preview_generations = {}
+catalog = {}
+search_indexes = {}
+asset_tables = {}
+state_caches = []
+refresh_stats = {"requests": 0, "recomputes": 0, "avoided": 0}
+refresh_state = {"flushing": False}
+thumbnail_builds = []
+icon_queue = queue.PriorityQueue()
+icon_sequence = itertools.count()
+icon_requests = []
+icon_pending = {}
+icon_atlases = {}
+library_watcher = {"thread": None, "stop": None}
+library_changes = queue.Queue()
+blend_prefetch = {"thread": None, "stop": None, "wanted": [], "active": None}
+prefetch_condition = threading.Condition()
+prefetched_files = OrderedDict()
+prefetch_stats = {"hits": 0, "partial": 0, "misses": 0, "cancelled": 0, "bytes": 0}
+gallery_pages = {}
+icon_loader = {"executor": None}
+imported_collections = {}
+node_role_index = {}
+throttle_state = {"writes": {}, "suspended": {}, "last_change": 0.0, "last_apply": 0.0}
+pending_thumbnails = set()
+profiling = {"enabled": False, "started": time.perf_counter()}
+profile_stats = {}
+profile_events = deque(maxlen=20000)
+
+CATALOG_FILENAME = ".cgh_catalog.json"
+CATALOG_VERSION = 1
+MANIFEST_FILENAME = ".cgh_manifest.json"
+MANIFEST_VERSION = 1
+
+LIBRARY_FOLDER_NAME = "CG Hood"
+LIBRARY_ENV_VAR = "CGHOOD_LIBRARY"
+SETTINGS_FILENAME = "cg_hood.json"
+PREVIEW_IMAGE_BYTES = 256 * 256 * 4
+THUMBNAIL_SIZE = 256
+PROFILE_SAMPLE_LIMIT = 1000
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+PREFETCH_HISTORY = 64
+SKIPPED_SEARCH_FOLDERS = {
+    "AppData", "Application Data", "Library", "Applications", "Local Settings",
+    "node_modules", "site-packages", "Windows", "Program Files", "Program Files (x86)",
+    "ProgramData", "System Volume Information", "$Recycle.Bin", "__pycache__", "venv",
+}
+library_discovery = {"path": "", "source": "", "seconds": 0.0, "failed": False}
 
 
 def cached(func):
@@ -29,6 +92,132 @@ def cached(func):
     return wrapper
 
 
+FilterState = namedtuple("FilterState", (
+    "category_index", "winter_bool", "spring_bool", "summer_bool", "autumn_bool", "search_str", "rank_results"))
+SelectionState = namedtuple("SelectionState", ("filter_state", "asset_name"))
+AssetRecord = namedtuple("AssetRecord", (
+    "name", "thumbnail", "blend", "collection", "seasons", "keywords", "thumbnail_stamp"),
+    defaults=("", "", "", (), (), ""))
+
+
+class StateCache:
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = self.entries[key] = compute()
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, predicate=None):
+        if predicate is None:
+            self.entries.clear()
+            return
+        for key in [key for key in self.entries if predicate(key)]:
+            del self.entries[key]
+
+
+asset_items_cache = StateCache("asset_callback", 64)
+state_caches.append(asset_items_cache)
+
+
+def state_cached(state_func, maxsize=64):
+    def decorator(func):
+        cache = StateCache(func.__name__, maxsize)
+        state_caches.append(cache)
+
+        @functools.wraps(func)
+        def wrapper():
+            state = state_func()
+            if state is None:
+                return None
+            return cache.get(state, lambda: func(state))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def record_profile_sample(name, start_time, end_time):
+    stats = profile_stats.get(name)
+    if stats is None:
+        stats = profile_stats[name] = [0, 0.0, deque(maxlen=PROFILE_SAMPLE_LIMIT)]
+    elapsed = end_time - start_time
+    stats[0] += 1
+    stats[1] += elapsed
+    stats[2].append(elapsed)
+    profile_events.append((name, start_time, elapsed, threading.get_ident()))
+
+
+def profiled(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not profiling["enabled"]:
+            return func(*args, **kwargs)
+        start_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_profile_sample(name, start_time, time.perf_counter())
+    return wrapper
+
+
+def get_percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+def get_profile_stats():
+    result = {}
+    for name, (calls, total, samples) in sorted(profile_stats.items(), key=lambda item: -item[1][1]):
+        sorted_samples = sorted(samples)
+        result[name] = {
+            "calls": calls,
+            "total_ms": total * 1000,
+            "p50_ms": get_percentile(sorted_samples, 0.5) * 1000,
+            "p95_ms": get_percentile(sorted_samples, 0.95) * 1000,
+            "max_ms": sorted_samples[-1] * 1000,
+        }
+    return result
+
+
+def get_profile_report():
+    cache_stats = get_cache_stats()
+    for stats in cache_stats.values():
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return {"functions": get_profile_stats(), "caches": cache_stats, "refresh": dict(refresh_stats),
+            "prefetch": dict(prefetch_stats)}
+
+
+def get_chrome_trace():
+    process_id = os.getpid()
+    events = [{"name": name, "cat": "cg_hood", "ph": "X", "pid": process_id, "tid": thread_id,
+               "ts": (start_time - profiling["started"]) * 1e6, "dur": elapsed * 1e6}
+              for name, start_time, elapsed, thread_id in list(profile_events)]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def reset_profile():
+    profile_stats.clear()
+    profile_events.clear()
+    profiling["started"] = time.perf_counter()
+    for cache in state_caches:
+        cache.hits = cache.misses = 0
+    for name in prefetch_stats:
+        prefetch_stats[name] = 0
+
+
 def check_context_property(func):
     def wrapper(*args, **kwargs):
         if bpy.context.scene is not None and hasattr(bpy.context.scene, "my_property"):
@@ -38,27 +227,225 @@ def check_context_property(func):
     return wrapper
 
 
+def get_preferences():
+    addon = bpy.context.preferences.addons.get(__name__)
+    return addon.preferences if addon else None
+
+
+def get_settings_path():
+    return os.path.join(bpy.utils.user_resource('CONFIG', path="cg_hood", create=True), SETTINGS_FILENAME)
+
+
+def read_settings():
+    try:
+        with open(get_settings_path(), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_settings(**values):
+    settings = read_settings()
+    settings.update(values)
+    try:
+        with open(get_settings_path(), "w", encoding="utf-8") as file:
+            json.dump(settings, file, indent=2)
+    except OSError as error:
+        print(f"CG Hood: could not save the settings ({error})")
+
+
+def is_skipped_folder(name):
+    return name.startswith((".", "$", "~")) or name in SKIPPED_SEARCH_FOLDERS
+
+
+def search_folder_breadth_first(top_folder, folder_name, max_depth, stop_event):
+    frontier = deque([(top_folder, 0)])
+    while frontier and not stop_event.is_set():
+        folder, depth = frontier.popleft()
+        try:
+            with os.scandir(folder) as entries:
+                subfolders = [entry for entry in entries
+                              if entry.is_dir(follow_symlinks=False) and not is_skipped_folder(entry.name)]
+        except OSError:
+            continue
+        for entry in subfolders:
+            if entry.name == folder_name:
+                return entry.path
+        if depth < max_depth:
+            frontier.extend((entry.path, depth + 1) for entry in subfolders)
+    return None
+
+
+def search_library_folder(home_directory, max_depth, timeout):
+    try:
+        with os.scandir(home_directory) as entries:
+            top_folders = [entry.path for entry in entries
+                           if entry.is_dir(follow_symlinks=False) and not is_skipped_folder(entry.name)]
+    except OSError:
+        return None
+
+    stop_event = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(16, len(top_folders) or 1))
+    futures = {executor.submit(search_folder_breadth_first, folder, LIBRARY_FOLDER_NAME, max_depth - 1, stop_event)
+               for folder in top_folders}
+    deadline = time.monotonic() + timeout
+    found_path = None
+    try:
+        while futures and found_path is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"CG Hood: library search timed out after {timeout:.0f}s")
+                break
+            done, futures = concurrent.futures.wait(
+                futures, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.result():
+                    found_path = future.result()
+                    break
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return found_path
+
+
+def find_library_folder():
+    preferences = get_preferences()
+    candidates = [
+        ("preferences", bpy.path.abspath(preferences.library_path) if preferences and preferences.library_path else ""),
+        ("environment", os.environ.get(LIBRARY_ENV_VAR, "")),
+        ("last known location", read_settings().get("library_path", "")),
+        ("home folder", str(Path.home() / LIBRARY_FOLDER_NAME)),
+    ]
+    for source, path in candidates:
+        if path and os.path.isdir(path):
+            return os.path.normpath(path), source
+
+    max_depth = preferences.search_depth if preferences else 4
+    timeout = preferences.search_timeout if preferences else 10.0
+    path = search_library_folder(str(Path.home()), max_depth, timeout)
+    return path, "search"
+
+
 @cached
 def get_assetfolder():
-    home_directory = Path.home()
-    cg_hood_folder_path = home_directory / "CG Hood"
-    if not cg_hood_folder_path.exists():
-        for path in home_directory.rglob("CG Hood"):
-            if path.is_dir():
-                cg_hood_folder_path = path
-                break
-        else:
-            raise Exception("The CG Hood directory has not been found.")
-    test_folder_path = cg_hood_folder_path / "TEST"
+    if library_discovery["failed"]:
+        raise Exception("The CG Hood directory has not been found.")
+    start_time = time.perf_counter()
+    cg_hood_folder_path, source = find_library_folder()
+    elapsed = time.perf_counter() - start_time
+    library_discovery.update(path=cg_hood_folder_path or "", source=source, seconds=elapsed,
+                             failed=cg_hood_folder_path is None)
+    if cg_hood_folder_path is None:
+        print(f"CG Hood: library search gave up after {elapsed:.2f}s")
+        raise Exception("The CG Hood directory has not been found.")
+    print(f"CG Hood: library found in {elapsed:.2f}s ({source}): {cg_hood_folder_path}")
+    if source == "search":
+        write_settings(library_path=cg_hood_folder_path)
+    test_folder_path = Path(cg_hood_folder_path) / "TEST"
     return str(test_folder_path)
 
 
+def get_catalog_path():
+    return os.path.join(get_assetfolder(), CATALOG_FILENAME)
+
+
+def read_catalog_file(root):
+    try:
+        with open(get_catalog_path(), "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != CATALOG_VERSION or data.get("root") != root:
+        return {}
+    return data
+
+
+def write_catalog_file():
+    try:
+        temp_path = get_catalog_path() + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(catalog, file)
+        os.replace(temp_path, get_catalog_path())
+    except OSError as error:
+        print(f"CG Hood: could not write the asset catalog ({error})")
+
+
+def scan_folder(folder, extension, previous):
+    try:
+        folder_mtime = os.stat(folder).st_mtime
+    except OSError:
+        return {"mtime": None, "files": {}}, previous is not None and previous["mtime"] is not None
+    if previous is not None and previous["mtime"] == folder_mtime:
+        return previous, False
+
+    files = {}
+    with os.scandir(folder) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.name.endswith(extension) and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = [stat.st_mtime, stat.st_size]
+    return {"mtime": folder_mtime, "files": files}, True
+
+
+def refresh_catalog():
+    root = get_assetfolder()
+    if not catalog:
+        catalog.update(read_catalog_file(root) or {
+            "version": CATALOG_VERSION, "root": root, "mtime": None, "categories": {},
+        })
+
+    changed_categories = []
+    categories = catalog["categories"]
+    root_mtime = os.stat(root).st_mtime
+    if catalog["mtime"] != root_mtime:
+        with os.scandir(root) as entries:
+            names = sorted(entry.name for entry in entries
+                           if entry.is_dir() and not entry.name.startswith("."))
+        for name in list(categories):
+            if name not in names:
+                del categories[name]
+                changed_categories.append(name)
+        for name in names:
+            categories.setdefault(name, {"Iconfiles": None, "Blendfiles": None})
+        catalog["categories"] = {name: categories[name] for name in names}
+        categories = catalog["categories"]
+        catalog["mtime"] = root_mtime
+        get_categories.cache_clear()
+
+    for name, category in categories.items():
+        category_folder = os.path.join(root, name)
+        iconfiles, icons_changed = scan_folder(
+            os.path.join(category_folder, "Iconfiles"), ".jpg", category["Iconfiles"])
+        blendfiles, blends_changed = scan_folder(
+            os.path.join(category_folder, "Blendfiles"), ".blend", category["Blendfiles"])
+        category["Iconfiles"] = iconfiles
+        category["Blendfiles"] = blendfiles
+        if icons_changed or blends_changed:
+            changed_categories.append(name)
+
+    if changed_categories or not os.path.exists(get_catalog_path()):
+        write_catalog_file()
+    return changed_categories
+
+
+def get_catalog():
+    if not catalog:
+        refresh_catalog()
+    return catalog
+
+
+def get_category_files(category, folder="Iconfiles"):
+    entry = get_catalog()["categories"].get(category)
+    if entry is None or entry[folder] is None:
+        return []
+    return list(entry[folder]["files"])
+
+
 @cached
 def get_categories():
-    return os.listdir(get_assetfolder())
+    return list(get_catalog()["categories"])
 
 
-@cached
 def get_category_index():
     if hasattr(bpy.context, "scene") and bpy.context.scene is not None and hasattr(bpy.context.scene, "my_property"):
         _, category_index = bpy.context.scene.my_property.category_enum.split(
@@ -68,186 +455,856 @@ def get_category_index():
         return 0
 
 
-@cached
-def get_categoryfolder():
-    return os.path.join(get_assetfolder(), get_categories()[get_category_index()])
-
-
 season_filtered_categories = ["Coni", "Deci"]
+seasons = ("winter", "spring", "summer", "autumn")
+
+
+def get_manifest_path(category):
+    return os.path.join(get_assetfolder(), category, MANIFEST_FILENAME)
+
+
+def get_manifest_sources(category):
+    entry = get_catalog()["categories"].get(category, {})
+    return [entry[folder]["mtime"] if entry.get(folder) else None for folder in ("Iconfiles", "Blendfiles")]
+
+
+def get_name_keywords(name):
+    return sorted({word for word in re.split(r"[^0-9a-z]+", name.lower()) if word})
+
+
+def generate_manifest(category):
+    icon_files = get_catalog()["categories"][category]["Iconfiles"]
+    assets = []
+    for file in get_category_files(category):
+        name = os.path.splitext(file)[0]
+        mtime, size = icon_files["files"][file]
+        assets.append([
+            name,
+            f"Iconfiles/{file}",
+            f"Blendfiles/{name}.blend",
+            name,
+            [season for season in seasons if season in name.lower()] if category in season_filtered_categories else [],
+            get_name_keywords(name),
+            f"{int(mtime * 1000):x}-{size:x}",
+        ])
+    return {
+        "version": MANIFEST_VERSION,
+        "generated": True,
+        "sources": get_manifest_sources(category),
+        "fields": list(AssetRecord._fields),
+        "assets": assets,
+    }
+
+
+def get_manifest_mtime(category):
+    try:
+        return os.stat(get_manifest_path(category)).st_mtime
+    except OSError:
+        return None
 
 
-def filter_files(file_list, search_str, winter_bool, spring_bool, summer_bool, autumn_bool):
-    category_name = get_categories()[get_category_index()]
-    if category_name in season_filtered_categories:
-        filtered_files = [file for file in file_list
-                        if (winter_bool and "winter" in file.lower()) or
-                        (spring_bool and "spring" in file.lower()) or
-                        (summer_bool and "summer" in file.lower()) or
-                        (autumn_bool and "autumn" in file.lower())]
+def read_manifest(category):
+    try:
+        with open(get_manifest_path(category), "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    if manifest.get("generated") and manifest.get("sources") != get_manifest_sources(category):
+        return None
+    return manifest
+
+
+def write_manifest(category, manifest):
+    try:
+        temp_path = get_manifest_path(category) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, separators=(",", ":"))
+        os.replace(temp_path, get_manifest_path(category))
+    except OSError as error:
+        print(f"CG Hood: could not write the manifest of {category} ({error})")
+
+
+def make_asset_record(fields, row):
+    values = {field: value for field, value in zip(fields, row) if field in AssetRecord._fields}
+    name = values["name"]
+    values["thumbnail"] = values.get("thumbnail") or f"Iconfiles/{name}.jpg"
+    values["blend"] = values.get("blend") or f"Blendfiles/{name}.blend"
+    values["collection"] = values.get("collection") or name
+    values["seasons"] = tuple(season.lower() for season in values.get("seasons", ()))
+    values["keywords"] = tuple(keyword.lower() for keyword in values.get("keywords", ()))
+    return AssetRecord(**values)
+
+
+def load_asset_table(category):
+    manifest = read_manifest(category)
+    if manifest is None:
+        manifest = generate_manifest(category)
+        write_manifest(category, manifest)
+    records = [make_asset_record(manifest["fields"], row) for row in manifest["assets"]]
+    files = [os.path.basename(record.thumbnail) for record in records]
+    return {
+        "records": records,
+        "files": files,
+        "by_file": dict(zip(files, records)),
+        "by_name": {record.name: record for record in records},
+        "seasonal": any(record.seasons for record in records),
+        "manifest_mtime": get_manifest_mtime(category),
+    }
+
+
+def get_asset_table(category):
+    entry = get_catalog()["categories"].get(category, {})
+    source = (entry.get("Iconfiles"), entry.get("Blendfiles"))
+    table = asset_tables.get(category)
+    if table is None or table["source"][0] is not source[0] or table["source"][1] is not source[1]:
+        table = load_asset_table(category)
+        table["source"] = source
+        asset_tables[category] = table
+    return table
+
+
+def refresh_asset_tables():
+    changed_categories = [category for category, table in asset_tables.items()
+                          if table["manifest_mtime"] != get_manifest_mtime(category)]
+    for category in changed_categories:
+        del asset_tables[category]
+    return changed_categories
+
+
+def get_record_file(record):
+    return os.path.basename(record.thumbnail)
+
+
+def iter_set_bits(bits):
+    return (i for i, bit in enumerate(reversed(bin(bits))) if bit == "1")
+
+
+def get_trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def to_bits(indices, size):
+    bitmap = bytearray((size + 7) // 8)
+    for i in indices:
+        bitmap[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bitmap, "little")
+
+
+def build_search_index(table):
+    records = table["records"]
+    files = table["files"]
+    names = [record.name.lower() for record in records]
+    texts = [" ".join([name] + [keyword for keyword in record.keywords if keyword not in name])
+             for name, record in zip(names, records)]
+    season_masks = []
+    season_postings = [[] for _ in seasons]
+    for i, record in enumerate(records):
+        mask = 0
+        for season_index, season in enumerate(seasons):
+            if season in record.seasons:
+                mask |= 1 << season_index
+                season_postings[season_index].append(i)
+        season_masks.append(mask)
+    return {
+        "files": files,
+        "names": names,
+        "texts": texts,
+        "keywords": [record.keywords for record in records],
+        "seasonal": table["seasonal"],
+        "season_masks": season_masks,
+        "season_bits": [to_bits(postings, len(files)) for postings in season_postings],
+        "positions": {file: i for i, file in enumerate(files)},
+        "all_bits": (1 << len(files)) - 1,
+        "trigram_bits": None,
+        "words": None,
+    }
+
+
+def get_trigram_bits(index):
+    if index["trigram_bits"] is None:
+        postings = defaultdict(list)
+        for i, text in enumerate(index["texts"]):
+            for trigram in get_trigrams(text):
+                postings[trigram].append(i)
+        size = len(index["files"])
+        index["trigram_bits"] = {trigram: to_bits(indices, size) for trigram, indices in postings.items()}
+    return index["trigram_bits"]
+
+
+def get_words(index):
+    if index["words"] is None:
+        index["words"] = [set(re.split(r"[^0-9a-z]+", name)).union(keywords)
+                          for name, keywords in zip(index["names"], index["keywords"])]
+    return index["words"]
+
+
+def get_search_index(category_name):
+    source = get_asset_table(category_name)
+    index = search_indexes.get(category_name)
+    if index is None or index["source"] is not source:
+        index = build_search_index(source)
+        index["source"] = source
+        search_indexes[category_name] = index
+    return index
+
+
+def rank_match(index, i, search_str):
+    if index["names"][i].startswith(search_str):
+        return 0
+    if search_str in get_words(index)[i]:
+        return 1
+    return 2
+
+
+@profiled
+def filter_files(category_name, search_str, winter_bool, spring_bool, summer_bool, autumn_bool, rank=False):
+    index = get_search_index(category_name)
+    if index["seasonal"]:
+        bits = 0
+        for season_bits, enabled in zip(index["season_bits"], (winter_bool, spring_bool, summer_bool, autumn_bool)):
+            if enabled:
+                bits |= season_bits
     else:
-        filtered_files = file_list
+        bits = index["all_bits"]
 
     if search_str:
-        filtered_files = [file for file in filtered_files if search_str in file.lower()]
+        trigram_bits = get_trigram_bits(index) if len(search_str) >= 3 else {}
+        for trigram in get_trigrams(search_str):
+            bits &= trigram_bits.get(trigram, 0)
+            if not bits:
+                break
+        texts = index["texts"]
+        matches = [i for i in iter_set_bits(bits) if search_str in texts[i]]
+        if rank:
+            matches.sort(key=lambda i: rank_match(index, i, search_str))
+    else:
+        matches = iter_set_bits(bits)
 
-    return filtered_files
+    files = index["files"]
+    return [files[i] for i in matches]
 
 
-def get_iconfolder():
-    return os.path.abspath(os.path.join(get_categoryfolder(), "Iconfiles"))
+@check_context_property
+def get_filter_state():
+    my_property = bpy.context.scene.my_property
+    return FilterState(
+        get_category_index(),
+        my_property.winter_bool,
+        my_property.spring_bool,
+        my_property.summer_bool,
+        my_property.autumn_bool,
+        my_property.search_str.lower(),
+        my_property.rank_results,
+    )
 
 
-@cached
 @check_context_property
-def get_iconfiles():
-    winter_bool = bpy.context.scene.my_property.winter_bool
-    spring_bool = bpy.context.scene.my_property.spring_bool
-    summer_bool = bpy.context.scene.my_property.summer_bool
-    autumn_bool = bpy.context.scene.my_property.autumn_bool
-    search_str = bpy.context.scene.my_property.search_str.lower()
+def get_selection_state():
+    return SelectionState(get_filter_state(), get_asset_name())
 
-    iconfiles = [file for file in os.listdir(get_iconfolder()) if file.endswith(".jpg")]
 
-    iconfiles = filter_files(iconfiles, search_str, winter_bool, spring_bool, summer_bool, autumn_bool)
+@profiled
+@state_cached(get_filter_state)
+def get_iconfiles(state):
+    iconfiles = filter_files(get_categories()[state.category_index], state.search_str,
+                             state.winter_bool, state.spring_bool, state.summer_bool, state.autumn_bool,
+                             state.rank_results)
     return iconfiles
 
 
-@cached
-@check_context_property
-def get_iconfileslist():
-    return [os.path.join(get_iconfolder(), file) for file in get_iconfiles()]
+@state_cached(get_filter_state)
+def get_iconfileslist(state):
+    category = get_categories()[state.category_index]
+    by_file = get_asset_table(category)["by_file"]
+    category_folder = os.path.join(get_assetfolder(), category)
+    return [os.path.normpath(os.path.join(category_folder, by_file[file].thumbnail)) for file in get_iconfiles()]
 
 
-@cached
-@check_context_property
-def get_asset_index():
-    asset_enum_split = bpy.context.scene.my_property.asset_enum.split(" ")
-    if len(asset_enum_split) == 2:
-        _, asset_index = asset_enum_split
-        return int(asset_index)
-    else:
-        return None
+@state_cached(get_filter_state)
+def get_iconfile_positions(state):
+    return {file: i for i, file in enumerate(get_iconfiles())}
+
 
-@cached
 @check_context_property
-def get_blendfileslist():
-    index_to_use = 0 if get_asset_index() is None else get_asset_index()
-    return get_iconfileslist()[index_to_use].replace("Iconfiles", "Blendfiles").replace(".jpg", ".blend")
+def get_asset_name():
+    return bpy.context.scene.my_property.asset_enum or None
 
 
-@cached
-@check_context_property
-def get_object():
-    object_list = get_iconfiles()
-    if not object_list:
+def get_selected_position(state):
+    record = get_asset_table(get_categories()[state.filter_state.category_index])["by_name"].get(state.asset_name)
+    if record is None:
+        return 0
+    return get_iconfile_positions().get(get_record_file(record), 0)
+
+
+@state_cached(get_selection_state)
+def get_selected_record(state):
+    iconfiles = get_iconfiles()
+    if not iconfiles:
+        return None
+    category = get_categories()[state.filter_state.category_index]
+    return get_asset_table(category)["by_file"][iconfiles[get_selected_position(state)]]
+
+
+@state_cached(get_selection_state)
+def get_blendfileslist(state):
+    record = get_selected_record()
+    if record is None:
         return None
+    category_folder = os.path.join(get_assetfolder(), get_categories()[state.filter_state.category_index])
+    return os.path.normpath(os.path.join(category_folder, record.blend))
 
-    index_to_use = 0 if get_asset_index() is None else get_asset_index()
-    object = object_list[index_to_use].replace(".jpg", "")
-    return object
+
+@state_cached(get_selection_state)
+def get_object(state):
+    record = get_selected_record()
+    return record.collection if record else None
 
 
 def update_selected_asset(context):
     scene = context.scene
     my_property = scene.my_property
     filtered_assets = get_iconfiles()
-    items = [(f'asset {i}', asset, "")
-             for i, asset in enumerate(filtered_assets)]
-
-    if hasattr(bpy.types.Scene.my_property, "asset_enum"):
-        bpy.types.Scene.my_property.asset_enum.items = items
-
     if not filtered_assets:
-        if items:
-            my_property.asset_enum = 'asset 0'
-    else:
-        current_enum_value = my_property.asset_enum
-        if current_enum_value not in [f'asset {i}' for i, _ in enumerate(filtered_assets)]:
-            if items:
-                my_property.asset_enum = f'asset 0'
+        return
+
+    table = get_asset_table(get_categories()[get_category_index()])
+    record = table["by_name"].get(my_property.asset_enum)
+    position = get_iconfile_positions().get(get_record_file(record)) if record else None
+    page_size = get_gallery_page_size()
+    if position is None:
+        position = get_gallery_page() * page_size
+        my_property.asset_enum = table["by_file"][filtered_assets[position]].name
+    if page_size and my_property.gallery_page != position // page_size + 1:
+        my_property.gallery_page = position // page_size + 1
 
 
 def category_callback(self, context):
     return [(f'category {i}', category, "") for i, category in enumerate(get_categories())]
 
 
-def load_category_icons(category_index, category):
+def get_preview_key(category_index):
+    return f"category_{category_index}_thumbnails"
+
+
+def get_thumbnail_folder():
+    return bpy.utils.user_resource('DATAFILES', path=os.path.join("cg_hood", "thumbnails"), create=True)
+
+
+def get_thumbnail_size():
+    preferences = get_preferences()
+    return preferences.thumbnail_size if preferences else THUMBNAIL_SIZE
+
+
+@cached
+def get_thumbnail_keys():
+    if cghood_tools is None:
+        return set()
+    return cghood_tools.list_thumbnail_keys(get_thumbnail_folder())
+
+
+def get_thumbnail_settings():
+    return get_assetfolder(), get_thumbnail_folder(), get_thumbnail_size()
+
+
+def get_icon_sources(category, icon_files):
+    by_file = get_asset_table(category)["by_file"]
+    catalog_files = catalog["categories"][category]["Iconfiles"]["files"]
     category_folder = os.path.join(get_assetfolder(), category)
-    icon_files_folder = os.path.abspath(
-        os.path.join(category_folder, "Iconfiles"))
-    icon_files = [file for file in os.listdir(
-        icon_files_folder) if file.endswith(".jpg")]
-    icon_files_list = [os.path.join(icon_files_folder, file)
-                       for file in icon_files]
+    icon_files_folder = os.path.join(category_folder, "Iconfiles")
+    sources = []
+    for icon_file in icon_files:
+        record = by_file.get(icon_file)
+        if record is None or record.thumbnail == f"Iconfiles/{icon_file}":
+            sources.append((icon_file, os.path.join(icon_files_folder, icon_file), catalog_files.get(icon_file)))
+            continue
+        thumbnail = os.path.normpath(record.thumbnail)
+        in_catalog = thumbnail == os.path.join("Iconfiles", icon_file)
+        sources.append((icon_file, os.path.join(category_folder, thumbnail),
+                        catalog_files.get(icon_file) if in_catalog else None))
+    return sources
+
+
+def stat_icon_source(path, stat):
+    if stat is not None:
+        return stat
+    try:
+        source_stat = os.stat(path)
+    except OSError:
+        return None
+    return [source_stat.st_mtime, source_stat.st_size]
+
+
+def get_thumbnail_job(source_path, stat, settings=None):
+    _, thumbnail_folder, thumbnail_size = settings or get_thumbnail_settings()
+    mtime, size = stat
+    key = cghood_tools.thumbnail_key(source_path, mtime, size, thumbnail_size)
+    return key, (source_path, cghood_tools.thumbnail_path(thumbnail_folder, key), thumbnail_size)
+
+
+def get_thumbnail_workers():
+    preferences = get_preferences()
+    return preferences.thumbnail_workers if preferences and preferences.thumbnail_workers else None
+
+
+def build_thumbnails(jobs):
+    return cghood_tools.build_thumbnails(jobs, get_thumbnail_workers(), bpy.app.binary_path)
+
+
+def schedule_thumbnail_build(category_index, jobs):
+    jobs = {name: job for name, job in jobs.items() if job[1] not in pending_thumbnails}
+    if not jobs:
+        return
+    pending_thumbnails.update(job[1] for job in jobs.values())
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(build_thumbnails, list(jobs.values()))
+    executor.shutdown(wait=False)
+    thumbnail_builds.append((category_index, jobs, future))
+    if not bpy.app.timers.is_registered(poll_thumbnail_builds):
+        bpy.app.timers.register(poll_thumbnail_builds, first_interval=0.5)
+
+
+def poll_thumbnail_builds():
+    for build in [build for build in thumbnail_builds if build[2].done()]:
+        thumbnail_builds.remove(build)
+        category_index, jobs, future = build
+        pending_thumbnails.difference_update(job[1] for job in jobs.values())
+        built_paths = set(future.result()) if future.exception() is None else set()
+        pcoll = preview_collections.get(get_preview_key(category_index))
+        pending = icon_pending.get(category_index, {})
+        for name, (_, thumbnail_path, _) in jobs.items():
+            if thumbnail_path not in built_paths:
+                continue
+            get_thumbnail_keys().add(os.path.splitext(os.path.basename(thumbnail_path))[0])
+            if pcoll is not None and (name in pcoll or name in pending):
+                preview = pcoll.load(name, thumbnail_path, 'IMAGE', force_reload=True)
+                preview_icon_ids[get_preview_key(category_index)][name] = preview.icon_id
+        if pcoll is not None:
+            bump_preview_generation(category_index)
+    return 0.5 if thumbnail_builds else None
+
+
+def get_icon_executor():
+    if icon_loader["executor"] is None:
+        icon_loader["executor"] = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    return icon_loader["executor"]
+
+
+def get_category_atlas(category, settings):
+    if cghood_tools is None:
+        return None
+    path = cghood_tools.atlas_path(settings[1], os.path.join(settings[0], category))
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    cached_atlas = icon_atlases.get(path)
+    if cached_atlas is None or cached_atlas[0] != mtime:
+        cached_atlas = icon_atlases[path] = (mtime, cghood_tools.read_atlas(path))
+    atlas = cached_atlas[1]
+    if atlas is None or atlas["thumbnail_size"] != settings[2]:
+        return None
+    return atlas
+
+
+@profiled
+def discover_category_icons(category_index, category, sources, pcoll, priority, settings, thumbnail_keys, decode):
+    atlas = get_category_atlas(category, settings)
+    missing_thumbnails = {}
+    failed_files = []
+    for icon_file, source_path, stat in sources:
+        stat = stat_icon_source(source_path, stat)
+        if stat is None:
+            failed_files.append(icon_file)
+            continue
+        entry = atlas["entries"].get(icon_file) if atlas else None
+        if entry is not None and entry[:2] == stat:
+            pixels = ((entry[2], entry[3]), cghood_tools.get_atlas_pixels(atlas, entry), True)
+            icon_queue.put((priority, next(icon_sequence), category_index, icon_file, None, pixels, pcoll))
+            continue
+        if cghood_tools is None:
+            icon_queue.put((priority, next(icon_sequence), category_index, icon_file, source_path, None, pcoll))
+            continue
+        key, job = get_thumbnail_job(source_path, stat, settings)
+        if key in thumbnail_keys:
+            path = job[1]
+        else:
+            path = source_path
+            missing_thumbnails[icon_file] = job
+        pixels = cghood_tools.decode_thumbnail(path, settings[2]) if decode else None
+        if pixels is not None:
+            pixels = (*pixels, False)
+        icon_queue.put((priority, next(icon_sequence), category_index, icon_file, path, pixels, pcoll))
+    return missing_thumbnails, failed_files
+
+
+def request_category_icons(category_index, icon_files, priority):
+    pcoll = preview_collections[get_preview_key(category_index)]
+    pending = icon_pending.setdefault(category_index, {})
+    icon_files = [icon_file for icon_file in icon_files
+                  if icon_file not in pcoll and pending.get(icon_file, priority + 1) > priority]
+    if not icon_files:
+        return
+    pending.update((icon_file, priority) for icon_file in icon_files)
+    category = get_categories()[category_index]
+    preferences = get_preferences()
+    decode = bool(preferences and preferences.decode_icons_in_background) and cghood_tools is not None and cghood_tools.can_decode()
+    future = get_icon_executor().submit(
+        discover_category_icons, category_index, category, get_icon_sources(category, icon_files), pcoll, priority,
+        get_thumbnail_settings(), get_thumbnail_keys(), decode)
+    icon_requests.append((category_index, icon_files, priority, future))
+    if not bpy.app.timers.is_registered(drain_icon_queue):
+        bpy.app.timers.register(drain_icon_queue, first_interval=0.0)
+
+
+def load_icon(pcoll, icon_file, path, pixels):
+    if pixels is None:
+        return pcoll.load(icon_file, path, 'IMAGE')
+    size, data, packed = pixels
+    preview = pcoll.new(icon_file)
+    preview.image_size = size
+    (preview.image_pixels if packed else preview.image_pixels_float).foreach_set(data)
+    return preview
+
+
+def get_icon_load_budget():
+    preferences = get_preferences()
+    return (preferences.icon_load_budget_ms if preferences else 8.0) / 1000.0
+
+
+@profiled
+def drain_icon_queue():
+    deadline = time.perf_counter() + get_icon_load_budget()
+    loaded = set()
+    while time.perf_counter() < deadline:
+        try:
+            priority, _, category_index, icon_file, path, pixels, pcoll = icon_queue.get_nowait()
+        except queue.Empty:
+            break
+        key = get_preview_key(category_index)
+        pending = icon_pending.get(category_index, {})
+        if preview_collections.get(key) is not pcoll or pending.get(icon_file) != priority:
+            continue
+        del pending[icon_file]
+        if icon_file in pcoll:
+            continue
+        preview = load_icon(pcoll, icon_file, path, pixels)
+        preview_icon_ids[key][icon_file] = preview.icon_id
+        loaded.add(category_index)
+
+    for request in [request for request in icon_requests if request[3].done()]:
+        icon_requests.remove(request)
+        category_index, icon_files, priority, future = request
+        if future.exception() is not None:
+            print(f"CG Hood: could not list the previews of category {category_index} ({future.exception()})")
+            pending = icon_pending.get(category_index, {})
+            for icon_file in icon_files:
+                if pending.get(icon_file) == priority:
+                    del pending[icon_file]
+            loaded.add(category_index)
+        elif get_preview_key(category_index) in preview_collections:
+            missing_thumbnails, failed_files = future.result()
+            pending = icon_pending.get(category_index, {})
+            for icon_file in failed_files:
+                pending.pop(icon_file, None)
+            if failed_files:
+                print(f"CG Hood: {len(failed_files)} previews of category {category_index} not found")
+                loaded.add(category_index)
+            schedule_thumbnail_build(category_index, missing_thumbnails)
+
+    for category_index in loaded:
+        bump_preview_generation(category_index)
+    if loaded:
+        enforce_preview_budget()
+        tag_redraw(bpy.context)
+    if icon_queue.empty() and not icon_requests:
+        return None
+    return 0.02
+
 
+@profiled
+def load_category_icons(category_index, category, priority=0):
     pcoll = bpy.utils.previews.new()
-    preview_collections[f"category_{category_index}_thumbnails"] = pcoll
+    preview_collections[get_preview_key(category_index)] = pcoll
+    preview_icon_ids[get_preview_key(category_index)] = {}
+    icon_pending[category_index] = {}
+    bump_preview_generation(category_index)
+    icon_files = get_asset_table(category)["files"]
+    page_size = get_gallery_page_size()
+    request_category_icons(category_index, icon_files[:page_size] if page_size else icon_files, priority)
+    return pcoll
+
+
+def get_loading_progress():
+    progress = []
+    for category_index, pending in icon_pending.items():
+        pcoll = preview_collections.get(get_preview_key(category_index))
+        if pending and pcoll is not None:
+            progress.append((get_categories()[category_index], len(pcoll), len(pcoll) + len(pending)))
+    return progress
+
+
+def bump_preview_generation(category_index):
+    key = get_preview_key(category_index)
+    preview_generations[key] = preview_generations.get(key, 0) + 1
+
+
+def release_category_icons(category_index):
+    preview_icon_ids.pop(get_preview_key(category_index), None)
+    bump_preview_generation(category_index)
+    pcoll = preview_collections.pop(get_preview_key(category_index), None)
+    if pcoll is not None:
+        bpy.utils.previews.remove(pcoll)
+    icon_pending.pop(category_index, None)
+    gallery_pages.pop(category_index, None)
+
+
+def release_all_icons():
+    for pcoll in preview_collections.values():
+        bpy.utils.previews.remove(pcoll)
+    preview_collections.clear()
+    preview_icon_ids.clear()
+    icon_pending.clear()
+    gallery_pages.clear()
+    icon_atlases.clear()
+    asset_items_cache.invalidate()
+
+
+def is_over_preview_budget():
+    preferences = get_preferences()
+    image_count = sum(len(pcoll) for pcoll in preview_collections.values())
+    if preferences is None:
+        return False
+    if preferences.preview_budget_mode == 'MEMORY':
+        return image_count * PREVIEW_IMAGE_BYTES > preferences.preview_budget_mb * 1024 * 1024
+    return image_count > preferences.preview_budget_images
+
+
+def enforce_preview_budget():
+    while len(preview_collections) > 1 and is_over_preview_budget():
+        key = next(iter(preview_collections))
+        category_index = int(key.split("_")[1])
+        release_category_icons(category_index)
+
+
+def ensure_category_icons(category_index, priority=0):
+    key = get_preview_key(category_index)
+    pcoll = preview_collections.get(key)
+    if pcoll is not None:
+        preview_collections.move_to_end(key)
+        pending = icon_pending.get(category_index)
+        if pending and priority < min(pending.values()):
+            request_category_icons(category_index, list(pending), priority)
+        return pcoll
+    categories = get_categories()
+    if not 0 <= category_index < len(categories):
+        return None
+    pcoll = load_category_icons(category_index, categories[category_index], priority)
+    enforce_preview_budget()
+    return pcoll
 
-    for i, icon_file in enumerate(icon_files_list):
-        pcoll.load(os.path.basename(icon_file), icon_file, 'IMAGE')
+
+def get_gallery_page_size():
+    preferences = get_preferences()
+    return preferences.gallery_page_size if preferences else 0
+
+
+def get_page_count(file_count, page_size):
+    return max(1, -(-file_count // page_size)) if page_size else 1
+
+
+def get_page_files(files, page, page_size):
+    return files[page * page_size:(page + 1) * page_size] if page_size else files
+
+
+def get_gallery_page():
+    page_count = get_page_count(len(get_iconfiles() or ()), get_gallery_page_size())
+    return min(max(bpy.context.scene.my_property.gallery_page - 1, 0), page_count - 1)
+
+
+def release_gallery_icons(category_index, keep):
+    key = get_preview_key(category_index)
+    pcoll = preview_collections[key]
+    released = [icon_file for icon_file in pcoll.keys() if icon_file not in keep]
+    for icon_file in released:
+        del pcoll[icon_file]
+        preview_icon_ids[key].pop(icon_file, None)
+    pending = icon_pending.get(category_index, {})
+    for icon_file in [icon_file for icon_file in pending if icon_file not in keep]:
+        del pending[icon_file]
+    if released:
+        bump_preview_generation(category_index)
+
+
+def prefetch_gallery_pages():
+    state = get_filter_state()
+    page_size = get_gallery_page_size()
+    if state is None or not page_size or ensure_category_icons(state.category_index) is None:
+        return
+    files = get_iconfiles()
+    page = get_gallery_page()
+    page_count = get_page_count(len(files), page_size)
+    pages = gallery_pages.setdefault(state.category_index, OrderedDict())
+    for neighbour, priority in ((page + 1, 1), (page - 1, 1), (page, 0)):
+        if 0 <= neighbour < page_count:
+            page_files = get_page_files(files, neighbour, page_size)
+            pages[(state, neighbour)] = frozenset(page_files)
+            pages.move_to_end((state, neighbour))
+            request_category_icons(state.category_index, page_files, priority)
+    preferences = get_preferences()
+    while len(pages) > max(3, preferences.gallery_page_window if preferences else 3):
+        pages.popitem(last=False)
+    release_gallery_icons(state.category_index, frozenset().union(*pages.values()))
 
 
 def load_all_icons():
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        for category_index, category in enumerate(get_categories()):
-            executor.submit(partial(load_category_icons, category_index, category))
+    for category_index in range(len(get_categories())):
+        if is_over_preview_budget():
+            break
+        ensure_category_icons(category_index, priority=1)
 
 
 def load_icons_on_startup():
-    if not preview_collections:
-        load_all_icons()
-        
+    if bpy.context.scene is not None and hasattr(bpy.context.scene, "my_property"):
+        ensure_category_icons(get_category_index())
+        start_library_watcher()
+    return None
+
+
+def build_asset_items(state, icon_ids, page, page_size):
+    category = get_categories()[state.category_index]
+    positions = get_search_index(category)["positions"]
+    by_file = get_asset_table(category)["by_file"]
+    items = []
+    for file in get_page_files(get_iconfiles(), page, page_size):
+        name = by_file[file].name
+        items.append((name, name, "", icon_ids.get(file, 0), positions[file]))
+    return items
 
+
+@profiled
 def asset_callback(self, context):
-    filtered_assets = get_iconfiles()
-    category_index = get_category_index()
-    pcoll = preview_collections.get(f"category_{category_index}_thumbnails")
-    if pcoll:
-        icon_files_list = get_iconfileslist()
-        valid_indices = [i for i, _ in enumerate(
-            filtered_assets) if i < len(icon_files_list)]
-        return [(f'asset {i}', asset, "", pcoll[os.path.basename(icon_files_list[i])].icon_id, i) for i, asset in zip(valid_indices, filtered_assets)]
-    else:
+    state = get_filter_state()
+    if state is None or ensure_category_icons(state.category_index) is None:
         return []
+    key = get_preview_key(state.category_index)
+    page_size = get_gallery_page_size()
+    page = get_gallery_page() if page_size else 0
+    if page_size and (state, page) not in gallery_pages.get(state.category_index, ()):
+        prefetch_gallery_pages()
+    return asset_items_cache.get((state, page_size, page, preview_generations[key]),
+                                 lambda: build_asset_items(state, preview_icon_ids[key], page, page_size))
 
 
 def clear_caches():
-    get_category_index.cache_clear()
-    get_categoryfolder.cache_clear()
-    get_iconfileslist.cache_clear()
-    get_iconfiles.cache_clear()
-    get_blendfileslist.cache_clear()
-    get_asset_index.cache_clear()
-    get_object.cache_clear()
-    loaded_categories.clear()
+    for cache in state_caches:
+        cache.invalidate()
+
+
+def invalidate_category_caches(category_index):
+    for cache in state_caches:
+        cache.invalidate(lambda state: (state if isinstance(state, FilterState) else state[0])
+                         .category_index == category_index)
+
+
+def get_cache_stats():
+    return {cache.name: {"hits": cache.hits, "misses": cache.misses, "size": len(cache.entries)}
+            for cache in state_caches}
+
+
+def get_search_debounce():
+    preferences = get_preferences()
+    return preferences.search_debounce if preferences else 0.3
+
+
+def tag_redraw(context):
+    window_manager = context.window_manager
+    if window_manager is None:
+        return
+    for window in window_manager.windows:
+        for area in window.screen.areas:
+            area.tag_redraw()
+
+
+def request_refresh(delay=0.0):
+    refresh_stats["requests"] += 1
+    if refresh_state["flushing"]:
+        refresh_stats["avoided"] += 1
+        return
+    if bpy.app.timers.is_registered(flush_refresh):
+        refresh_stats["avoided"] += 1
+        if not delay:
+            return
+        bpy.app.timers.unregister(flush_refresh)
+    bpy.app.timers.register(flush_refresh, first_interval=delay)
+
+
+def flush_refresh():
+    context = bpy.context
+    if context.scene is None or not hasattr(context.scene, "my_property"):
+        return None
+    refresh_state["flushing"] = True
+    try:
+        refresh_filters(context.scene.my_property, context)
+    finally:
+        refresh_state["flushing"] = False
+    refresh_stats["recomputes"] += 1
+    tag_redraw(context)
+    return None
+
+
+def update_category(self, context):
+    ensure_category_icons(get_category_index())
+    request_refresh()
 
 
 def update_enum(self, context):
-    clear_caches()
-    update_selected_asset(context)
-    update_filters(self, context)
+    request_refresh()
+    preferences = get_preferences()
+    if preferences and preferences.prefetch_blend_files:
+        request_blend_prefetch(get_prefetch_paths(preferences.prefetch_neighbours))
 
 
 def update_filters(self, context):
-    clear_caches()
-    update_selected_asset(context)
-    filtered_assets = get_iconfiles()
-    items = [(f'asset {i}', asset, "")
-             for i, asset in enumerate(filtered_assets)]
+    request_refresh()
 
-    if hasattr(bpy.types.Scene.my_property, "asset_enum"):
-        bpy.types.Scene.my_property.asset_enum.items = items
 
+def update_gallery_page(self, context):
+    page_size = get_gallery_page_size()
+    filtered_assets = get_iconfiles()
+    if not page_size or not filtered_assets:
+        return
+    page = get_gallery_page()
+    if self.gallery_page != page + 1:
+        self.gallery_page = page + 1
+        return
+    table = get_asset_table(get_categories()[get_category_index()])
+    record = table["by_name"].get(self.asset_enum)
+    position = get_iconfile_positions().get(get_record_file(record)) if record else None
+    if position is None or position // page_size != page:
+        self.asset_enum = table["by_file"][filtered_assets[page * page_size]].name
+    prefetch_gallery_pages()
+    tag_redraw(context)
+
+
+def update_search(self, context):
+    request_refresh(get_search_debounce())
+
+
+@profiled
+def refresh_filters(self, context):
+    update_selected_asset(context)
     object_name = get_object()
     if object_name is None:
         warning_filters(self, "No asset found. Please check your filters.")
     else:
         warning_filters(self, "")
-        
+
 
 def set_bool_prop(self, prop_name, value):
     self[prop_name] = value
-    update_filters(self, bpy.context)
 
 
 def set_season_bool(self, season, value):
@@ -259,37 +1316,806 @@ def warning_filters(self, message):
     self.warning_message_filter = message
     
     
+TREE_NODE_ROLES = {
+    "Main Tree": "main_tree",
+    "Join Geometry Wood": "join_wood",
+    "Join Geometry Leaves/Needles": "join_leaves_needles",
+    "Wood Material": "wood_material",
+    "Leaves": "leaves",
+    "Needles": "needles",
+    "Join Geometry": "join_geometry",
+}
+SHARED_SNOW_GROUP = "CGH Weather Snow"
+
+
+def find_tree_nodes(node_tree):
+    roles = {"secondary_trunks": []}
+    for node in node_tree.nodes:
+        role = TREE_NODE_ROLES.get(node.name)
+        if role:
+            roles[role] = node
+        elif node.name.startswith("Secondary Trunk"):
+            roles["secondary_trunks"].append(node)
+        elif node.type == 'GROUP_OUTPUT':
+            roles["group_output"] = node
+    return roles
+
+
+def get_snow_node(material):
+    snow_group = material.node_tree.nodes.get('Snow') if material and material.node_tree else None
+    if snow_group is None or snow_group.node_tree is None:
+        return None
+    return snow_group.node_tree.nodes.get('Value.002')
+
+
+def get_shared_snow_node():
+    node_group = bpy.data.node_groups.get(SHARED_SNOW_GROUP)
+    return node_group.nodes.get('Value.002') if node_group else None
+
+
+def get_snow_materials(objects):
+    return {slot.material for obj in objects for slot in obj.material_slots
+            if slot.material and slot.material.library is None and get_snow_node(slot.material)}
+
+
+def merge_snow_groups(materials, value=None):
+    shared = bpy.data.node_groups.get(SHARED_SNOW_GROUP)
+    merged = skipped = 0
+    for material in materials:
+        group_node = material.node_tree.nodes['Snow']
+        snow_group = group_node.node_tree
+        if snow_group == shared:
+            continue
+        if shared is None:
+            shared = snow_group.copy()
+            shared.name = SHARED_SNOW_GROUP
+            if value is not None:
+                shared.nodes['Value.002'].outputs[0].default_value = value
+        elif not is_same_datablock(snow_group, shared, ('Value.002',)):
+            skipped += 1
+            continue
+        group_node.node_tree = shared
+        if snow_group.users == 0:
+            bpy.data.node_groups.remove(snow_group)
+        merged += 1
+    if merged:
+        invalidate_node_roles()
+    return merged, skipped
+
+
+def get_node_roles_signature(obj, node_tree):
+    material = obj.material_slots[0].material if obj.material_slots else None
+    return len(node_tree.nodes), material.as_pointer() if material else 0
+
+
+def get_node_roles(obj):
+    if not obj or "CGH0" not in obj.name:
+        return None
+    tree = obj.modifiers.get('Tree')
+    if not tree or not tree.node_group:
+        return None
+    node_tree = tree.node_group
+    key = (obj.as_pointer(), node_tree.as_pointer())
+    signature = get_node_roles_signature(obj, node_tree)
+    entry = node_role_index.get(key)
+    if entry is None or entry[0] != signature:
+        roles = find_tree_nodes(node_tree)
+        roles["node_tree"] = node_tree
+        roles["seed_nodes"] = ([roles["main_tree"]] if "main_tree" in roles else []) + roles["secondary_trunks"]
+        roles["secondary_trunk_items"] = ([(str(i), node.name, "") for i, node in enumerate(roles["secondary_trunks"])]
+                                          or [('0', "No secondary trunk", "")])
+        roles["snow"] = get_snow_node(obj.material_slots[0].material) if obj.material_slots else None
+        entry = node_role_index[key] = (signature, roles)
+    return entry[1]
+
+
+def invalidate_node_roles(node_tree=None):
+    if node_tree is None:
+        node_role_index.clear()
+        return
+    pointer = node_tree.as_pointer()
+    for key in [key for key in node_role_index if key[1] == pointer]:
+        del node_role_index[key]
+
+
+def invalidate_bake_keys():
+    for _, roles in node_role_index.values():
+        roles.pop("bake_key", None)
+
+
+@bpy.app.handlers.persistent
+def node_roles_depsgraph_handler(scene, depsgraph):
+    if not node_role_index:
+        return
+    for update in depsgraph.updates:
+        if isinstance(update.id, (bpy.types.NodeTree, bpy.types.Material)):
+            invalidate_bake_keys()
+        if not isinstance(update.id, bpy.types.NodeTree):
+            continue
+        node_tree = update.id.original
+        pointer = node_tree.as_pointer()
+        for key, (signature, _) in list(node_role_index.items()):
+            if key[1] == pointer and signature[0] != len(node_tree.nodes):
+                del node_role_index[key]
+
+
+@bpy.app.handlers.persistent
+def node_roles_reset_handler(*args):
+    invalidate_node_roles()
+
+
+@bpy.app.handlers.persistent
+def throttle_reset_handler(*args):
+    reset_throttle_state()
+
+
+def get_interactive_settings():
+    preferences = get_preferences()
+    if preferences is None:
+        return 10.0, 'LIVE', 0.25
+    return preferences.interactive_update_rate, preferences.interactive_drag_mode, preferences.drag_release_delay
+
+
+def get_pending_value(socket):
+    write = throttle_state["writes"].get(socket.as_pointer())
+    return socket.default_value if write is None else write[1]
+
+
+def apply_socket_writes():
+    try:
+        for socket, value in throttle_state["writes"].values():
+            if socket.default_value != value:
+                socket.default_value = value
+    finally:
+        throttle_state["writes"].clear()
+        throttle_state["last_apply"] = time.perf_counter()
+
+
+def release_suspended_trees():
+    suspended = list(throttle_state["suspended"].values())
+    throttle_state["suspended"].clear()
+    for tree in suspended:
+        tree.show_viewport = True
+
+
+def release_suspended_tree(obj):
+    tree = obj.modifiers.get('Tree')
+    if tree is not None and throttle_state["suspended"].pop(tree.as_pointer(), None) is not None:
+        tree.show_viewport = True
+
+
+def reset_throttle_state():
+    throttle_state["writes"].clear()
+    release_suspended_trees()
+    if bpy.app.timers.is_registered(apply_throttled_writes):
+        bpy.app.timers.unregister(apply_throttled_writes)
+
+
+def queue_socket_writes(obj, sockets, value):
+    if not sockets:
+        return
+    rate, drag_mode, _ = get_interactive_settings()
+    if rate <= 0:
+        for socket in sockets:
+            socket.default_value = value
+        return
+    for socket in sockets:
+        throttle_state["writes"][socket.as_pointer()] = (socket, value)
+    throttle_state["last_change"] = time.perf_counter()
+    tree = obj.modifiers.get('Tree')
+    if drag_mode == 'SUSPEND' and tree and tree.show_viewport:
+        tree.show_viewport = False
+        throttle_state["suspended"][tree.as_pointer()] = tree
+    if not bpy.app.timers.is_registered(apply_throttled_writes):
+        bpy.app.timers.register(apply_throttled_writes, first_interval=0.0)
+
+
+def apply_throttled_writes():
+    rate, drag_mode, release_delay = get_interactive_settings()
+    now = time.perf_counter()
+    if now - throttle_state["last_change"] >= release_delay:
+        try:
+            apply_socket_writes()
+        finally:
+            release_suspended_trees()
+        return None
+    if drag_mode == 'LIVE' and throttle_state["writes"] and now - throttle_state["last_apply"] >= 1.0 / max(rate, 0.1):
+        apply_socket_writes()
+    return min(1.0 / max(rate, 0.1), release_delay)
+
+
+def get_parameter_sockets(obj, role, input_index, index=None):
+    roles = get_node_roles(obj)
+    nodes = roles.get(role) if roles else None
+    if not nodes:
+        return []
+    if not isinstance(nodes, list):
+        nodes = [nodes]
+    elif index is not None:
+        nodes = nodes[index:index + 1] if 0 <= index < len(nodes) else []
+    return [node.inputs[input_index] for node in nodes]
+
+
+def get_selected_trunk_index(self):
+    return int(self.secondary_trunk_nodes or -1)
+
+
+def get_main_tree_length(self):
+    sockets = get_parameter_sockets(bpy.context.active_object, "main_tree", 4)
+    return get_pending_value(sockets[0]) if sockets else 0.0
+
+
+def set_main_tree_length(self, value):
+    obj = bpy.context.active_object
+    queue_socket_writes(obj, get_parameter_sockets(obj, "main_tree", 4), value)
+
+
+def get_secondary_trunk_position(self):
+    sockets = get_parameter_sockets(bpy.context.active_object, "secondary_trunks", 3, get_selected_trunk_index(self))
+    return get_pending_value(sockets[0]) if sockets else 0.0
+
+
+def set_secondary_trunk_position(self, value):
+    obj = bpy.context.active_object
+    queue_socket_writes(obj, get_parameter_sockets(obj, "secondary_trunks", 3, get_selected_trunk_index(self)), value)
+
+
+def get_snow_amount(self):
+    node = get_shared_snow_node()
+    return node.outputs[0].default_value if node else self.get("snow_amount", 0.0)
+
+
+def set_snow_amount(self, value):
+    self["snow_amount"] = value
+    node = get_shared_snow_node()
+    if node is not None and node.outputs[0].default_value != value:
+        node.outputs[0].default_value = value
+
+
 def update_seed_value(self, context):
     obj = context.active_object
-    if obj and "CGH0" in obj.name:
-        tree = obj.modifiers.get('Tree')
-        if tree:
-            node_test = tree.node_group
-            for node in node_test.nodes:
-                if node.name.startswith('Secondary Trunk') or node.name == 'Main Tree':
-                    node.inputs[1].default_value = self.seed_value
+    queue_socket_writes(obj, get_parameter_sockets(obj, "seed_nodes", 1), self.seed_value)
 
 
 def secondary_trunk_nodes_items(self, context):
-    items = []
-    obj = context.active_object
-    if obj and "CGH0" in obj.name:
-        tree = obj.modifiers.get('Tree')
-        if tree:
-            node_test = tree.node_group
-            secondary_trunk_nodes = [node for node in node_test.nodes if node.name.startswith('Secondary Trunk')]
-            for i, node in enumerate(secondary_trunk_nodes):
-                items.append((str(i), node.name, ""))
-    if not items:
-        items.append(('0', "No secondary trunk", ""))
-    return items
+    roles = get_node_roles(context.active_object)
+    if roles:
+        return roles["secondary_trunk_items"]
+    return [('0', "No secondary trunk", "")]
+
+
+def poll_library_folders(root, reported):
+    try:
+        root_mtime = os.stat(root).st_mtime
+    except OSError:
+        return None
+    changes = {"root": root, "categories": None, "folders": {}}
+    categories = catalog["categories"]
+    names = list(categories)
+    if root_mtime != catalog["mtime"] and reported.get(root) != root_mtime:
+        with os.scandir(root) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_dir() and not entry.name.startswith("."))
+        changes["categories"] = (root_mtime, names)
+        reported[root] = root_mtime
+
+    for name in names:
+        category = categories.get(name) or {}
+        for folder, extension in (("Iconfiles", ".jpg"), ("Blendfiles", ".blend")):
+            path = os.path.join(root, name, folder)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                mtime = None
+            previous = category.get(folder)
+            if mtime == (previous["mtime"] if previous else None) or reported.get(path) == mtime:
+                continue
+            changes["folders"][(name, folder)] = scan_folder(path, extension, None)[0]
+            reported[path] = mtime
+    return changes if changes["categories"] or changes["folders"] else None
+
+
+def watch_library_folders(root, interval, stop_event):
+    reported = {}
+    while not stop_event.wait(interval):
+        if not catalog or catalog["root"] != root:
+            continue
+        try:
+            changes = poll_library_folders(root, reported)
+        except (OSError, RuntimeError) as error:
+            print(f"CG Hood: could not watch the library ({error})")
+            continue
+        if changes:
+            library_changes.put(changes)
+
+
+def diff_folder(previous, entry):
+    old_files = previous["files"] if previous else {}
+    new_files = entry["files"]
+    added = [file for file in new_files if file not in old_files]
+    removed = [file for file in old_files if file not in new_files]
+    changed = [file for file in new_files if file in old_files and old_files[file] != new_files[file]]
+    return added, removed, changed
+
+
+def apply_category_diff(category_index, category, diffs):
+    invalidate_category_caches(category_index)
+    _, removed_blends, changed_blends = diffs.get("Blendfiles", ((), (), ()))
+    blend_paths = {os.path.normpath(os.path.join(get_assetfolder(), category, "Blendfiles", file))
+                   for file in removed_blends + changed_blends}
+    for key in [key for key in imported_collections if key[0] in blend_paths]:
+        del imported_collections[key]
+    if changed_blends:
+        invalidate_bake_keys()
+        changed_paths = {os.path.normpath(os.path.join(get_assetfolder(), category, "Blendfiles", file))
+                         for file in changed_blends}
+        for library in bpy.data.libraries:
+            if os.path.normpath(bpy.path.abspath(library.filepath)) in changed_paths:
+                library.reload()
+
+    key = get_preview_key(category_index)
+    pcoll = preview_collections.get(key)
+    if pcoll is None or "Iconfiles" not in diffs:
+        return
+    added, removed, changed = diffs["Iconfiles"]
+    pending = icon_pending.get(category_index, {})
+    for icon_file in removed + changed:
+        if icon_file in pcoll:
+            del pcoll[icon_file]
+        preview_icon_ids[key].pop(icon_file, None)
+        pending.pop(icon_file, None)
+    if get_gallery_page_size():
+        gallery_pages.pop(category_index, None)
+    else:
+        request_category_icons(category_index, added + changed, 0)
+    bump_preview_generation(category_index)
+
+
+def apply_library_diff(changes):
+    if not catalog or catalog["root"] != changes["root"]:
+        return
+    categories_changed = False
+    if changes["categories"] is not None:
+        root_mtime, names = changes["categories"]
+        if names != list(catalog["categories"]):
+            catalog["categories"] = {name: catalog["categories"].get(name, {"Iconfiles": None, "Blendfiles": None})
+                                     for name in names}
+            categories_changed = True
+        catalog["mtime"] = root_mtime
+
+    diffs = {}
+    folders_changed = False
+    for (name, folder), entry in changes["folders"].items():
+        category = catalog["categories"].get(name)
+        if category is None or (category[folder] is not None and category[folder]["mtime"] == entry["mtime"]):
+            continue
+        folder_diff = diff_folder(category[folder], entry)
+        if any(folder_diff):
+            diffs.setdefault(name, {})[folder] = folder_diff
+        category[folder] = entry
+        folders_changed = True
+    if not categories_changed and not folders_changed:
+        return
+
+    write_catalog_file()
+    if categories_changed:
+        get_categories.cache_clear()
+        release_all_icons()
+        clear_caches()
+        print(f"CG Hood: library categories changed, {len(catalog['categories'])} categories found")
+    elif diffs:
+        categories = get_categories()
+        for name, category_diffs in diffs.items():
+            apply_category_diff(categories.index(name), name, category_diffs)
+        change_count = sum(len(files) for category_diffs in diffs.values()
+                           for folder_diff in category_diffs.values() for files in folder_diff)
+        print(f"CG Hood: {change_count} library changes picked up in {', '.join(diffs)}")
+    else:
+        return
+
+    context = bpy.context
+    if context.scene is not None and hasattr(context.scene, "my_property"):
+        refresh_filters(context.scene.my_property, context)
+        tag_redraw(context)
+
+
+def apply_library_changes():
+    if library_watcher["thread"] is None:
+        return None
+    while True:
+        try:
+            changes = library_changes.get_nowait()
+        except queue.Empty:
+            break
+        apply_library_diff(changes)
+    return 1.0
+
+
+def stop_library_watcher():
+    if library_watcher["stop"] is not None:
+        library_watcher["stop"].set()
+    library_watcher.update(thread=None, stop=None)
+    while not library_changes.empty():
+        library_changes.get_nowait()
+
+
+def start_library_watcher():
+    stop_library_watcher()
+    preferences = get_preferences()
+    if preferences is None or not preferences.watch_library:
+        return
+    try:
+        root = get_assetfolder()
+    except Exception:
+        return
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watch_library_folders, args=(root, preferences.watch_interval, stop_event),
+                              name="CG Hood library watcher", daemon=True)
+    library_watcher.update(thread=thread, stop=stop_event)
+    thread.start()
+    if not bpy.app.timers.is_registered(apply_library_changes):
+        bpy.app.timers.register(apply_library_changes, first_interval=1.0, persistent=True)
+
+
+def get_prefetch_paths(neighbours):
+    state = get_selection_state()
+    iconfiles = get_iconfiles()
+    if state is None or not iconfiles:
+        return []
+    category = get_categories()[state.filter_state.category_index]
+    by_file = get_asset_table(category)["by_file"]
+    category_folder = os.path.join(get_assetfolder(), category)
+    position = get_selected_position(state)
+    positions = [position] + [position + offset * direction for offset in range(1, neighbours + 1)
+                              for direction in (1, -1)]
+    paths = []
+    for i in positions:
+        if 0 <= i < len(iconfiles):
+            path = os.path.normpath(os.path.join(category_folder, by_file[iconfiles[i]].blend))
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def read_ahead(path, stop_event):
+    read = 0
+    try:
+        stat = os.stat(path)
+        with open(path, "rb", buffering=0) as file:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            buffer = bytearray(PREFETCH_CHUNK_SIZE)
+            while True:
+                if stop_event.is_set() or path not in blend_prefetch["wanted"]:
+                    prefetch_stats["cancelled"] += 1
+                    return None
+                count = file.readinto(buffer)
+                if not count:
+                    break
+                read += count
+    except OSError:
+        return None
+    finally:
+        prefetch_stats["bytes"] += read
+    return stat.st_mtime, stat.st_size
+
+
+def prefetch_blend_files(stop_event):
+    while not stop_event.is_set():
+        with prefetch_condition:
+            path = next((path for path in blend_prefetch["wanted"] if path not in prefetched_files), None)
+            if path is None:
+                prefetch_condition.wait()
+                continue
+            blend_prefetch["active"] = path
+        result = read_ahead(path, stop_event)
+        with prefetch_condition:
+            blend_prefetch["active"] = None
+            if result is None:
+                blend_prefetch["wanted"] = [wanted for wanted in blend_prefetch["wanted"] if wanted != path]
+                continue
+            prefetched_files[path] = result
+            prefetched_files.move_to_end(path)
+            while len(prefetched_files) > PREFETCH_HISTORY:
+                prefetched_files.popitem(last=False)
+
+
+def request_blend_prefetch(paths):
+    with prefetch_condition:
+        blend_prefetch["wanted"] = paths
+        prefetch_condition.notify()
+    if paths and blend_prefetch["thread"] is None:
+        stop_event = threading.Event()
+        thread = threading.Thread(target=prefetch_blend_files, args=(stop_event,),
+                                  name="CG Hood blend prefetch", daemon=True)
+        blend_prefetch.update(thread=thread, stop=stop_event)
+        thread.start()
+
+
+def stop_blend_prefetch():
+    if blend_prefetch["stop"] is not None:
+        blend_prefetch["stop"].set()
+    with prefetch_condition:
+        blend_prefetch["wanted"] = []
+        prefetch_condition.notify_all()
+    blend_prefetch.update(thread=None, stop=None)
+
+
+def record_prefetch_use(file_path):
+    with prefetch_condition:
+        entry = prefetched_files.get(file_path)
+        active = blend_prefetch["active"]
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return
+    if entry == (stat.st_mtime, stat.st_size):
+        prefetch_stats["hits"] += 1
+    elif active == file_path:
+        prefetch_stats["partial"] += 1
+    else:
+        prefetch_stats["misses"] += 1
+
+
+def update_library_path(self, context):
+    library_discovery["failed"] = False
+    get_assetfolder.cache_clear()
+    get_categories.cache_clear()
+    catalog.clear()
+    clear_caches()
+    release_all_icons()
+    if library_watcher["thread"] is not None:
+        start_library_watcher()
+
+
+def update_library_watcher(self, context):
+    start_library_watcher()
+
+
+def update_gallery_settings(self, context):
+    release_all_icons()
+
+
+def update_blend_prefetch(self, context):
+    if not self.prefetch_blend_files:
+        stop_blend_prefetch()
+
+
+def update_profiling(self, context):
+    profiling["enabled"] = self.enable_profiling
+
+
+def update_preview_budget(self, context):
+    enforce_preview_budget()
+
+
+class AssetSystemPreferences(bpy.types.AddonPreferences):
+    bl_idname = __name__
+
+    library_path: bpy.props.StringProperty(
+        name="Library folder",
+        description=f"Path of the \"{LIBRARY_FOLDER_NAME}\" folder. Leave empty to use ${LIBRARY_ENV_VAR}, "
+                    "the last known location or a search of the home folder",
+        subtype='DIR_PATH',
+        update=update_library_path,
+    )
+
+    search_depth: bpy.props.IntProperty(
+        name="Search depth",
+        description="How many folder levels below the home folder are searched for the library",
+        default=4,
+        min=1,
+        max=12,
+    )
+
+    search_timeout: bpy.props.FloatProperty(
+        name="Search timeout",
+        description="Seconds after which the library search gives up",
+        default=10.0,
+        min=0.5,
+        subtype='TIME',
+        unit='TIME',
+    )
+
+    preview_budget_mode: bpy.props.EnumProperty(
+        name="Preview budget",
+        items=[
+            ('IMAGES', "Image count", "Limit the number of loaded preview images"),
+            ('MEMORY', "Memory", "Limit the estimated memory used by preview images"),
+        ],
+        default='IMAGES',
+        update=update_preview_budget,
+    )
+
+    preview_budget_images: bpy.props.IntProperty(
+        name="Max previews",
+        description="Least recently used categories are unloaded above this number of preview images",
+        default=3000,
+        min=1,
+        update=update_preview_budget,
+    )
+
+    preview_budget_mb: bpy.props.IntProperty(
+        name="Max preview memory (MB)",
+        description="Least recently used categories are unloaded above this estimated preview memory",
+        default=512,
+        min=1,
+        update=update_preview_budget,
+    )
+
+    thumbnail_size: bpy.props.IntProperty(
+        name="Thumbnail size",
+        description="Size in pixels of the cached thumbnails loaded instead of the full resolution renders",
+        default=THUMBNAIL_SIZE,
+        min=32,
+        max=1024,
+    )
+
+    thumbnail_workers: bpy.props.IntProperty(
+        name="Thumbnail workers",
+        description="Number of processes building thumbnails, 0 uses one per CPU",
+        default=0,
+        min=0,
+    )
+
+    search_debounce: bpy.props.FloatProperty(
+        name="Search delay",
+        description="Seconds without typing after which the asset list is filtered by the search",
+        default=0.3,
+        min=0.0,
+        max=2.0,
+        subtype='TIME',
+        unit='TIME',
+    )
+
+    icon_load_budget_ms: bpy.props.FloatProperty(
+        name="Preview loading per tick (ms)",
+        description="Time spent loading previews on each UI update while a category is loading",
+        default=8.0,
+        min=1.0,
+        max=100.0,
+    )
+
+    decode_icons_in_background: bpy.props.BoolProperty(
+        name="Decode previews in background",
+        description="Decode thumbnails in worker threads when Pillow and NumPy are installed",
+        default=False,
+    )
+
+    interactive_update_rate: bpy.props.FloatProperty(
+        name="Slider updates per second",
+        description="How often seed and tree parameter changes are applied while a slider is dragged, 0 applies every change",
+        default=10.0,
+        min=0.0,
+        max=60.0,
+    )
+
+    interactive_drag_mode: bpy.props.EnumProperty(
+        name="While dragging",
+        items=[
+            ('LIVE', "Live", "Re-evaluate the tree at the update rate while dragging"),
+            ('SUSPEND', "Suspend tree", "Hide the Tree modifier in the viewport while dragging and evaluate once on release"),
+        ],
+        default='LIVE',
+    )
+
+    drag_release_delay: bpy.props.FloatProperty(
+        name="Release delay",
+        description="Seconds without a new value after which a drag is considered finished",
+        default=0.25,
+        min=0.05,
+        max=2.0,
+        subtype='TIME',
+        unit='TIME',
+    )
+
+    gallery_page_size: bpy.props.IntProperty(
+        name="Assets per page",
+        description="Number of assets shown at once in the asset gallery, 0 shows the whole category",
+        default=120,
+        min=0,
+        max=2000,
+        update=update_gallery_settings,
+    )
+
+    gallery_page_window: bpy.props.IntProperty(
+        name="Pages kept loaded",
+        description="Number of recently viewed gallery pages, including the neighbours of the current one, "
+                    "whose previews stay loaded",
+        default=5,
+        min=3,
+        max=50,
+        update=update_gallery_settings,
+    )
+
+    watch_library: bpy.props.BoolProperty(
+        name="Watch library",
+        description="Pick up assets added, removed or changed in the library while Blender is running",
+        default=True,
+        update=update_library_watcher,
+    )
+
+    watch_interval: bpy.props.FloatProperty(
+        name="Check every",
+        description="Seconds between two checks of the library folders for changes",
+        default=5.0,
+        min=1.0,
+        max=300.0,
+        subtype='TIME',
+        unit='TIME',
+        update=update_library_watcher,
+    )
+
+    prefetch_blend_files: bpy.props.BoolProperty(
+        name="Read ahead asset files",
+        description="Start reading the .blend file of the highlighted asset in the background while browsing, "
+                    "so placing it does not wait on a cold or network drive",
+        default=True,
+        update=update_blend_prefetch,
+    )
+
+    prefetch_neighbours: bpy.props.IntProperty(
+        name="Neighbours",
+        description="Number of assets on each side of the highlighted one that are also read ahead",
+        default=1,
+        min=0,
+        max=4,
+    )
+
+    enable_profiling: bpy.props.BoolProperty(
+        name="Collect timings",
+        description="Time the filtering, preview loading and panel drawing code and show the results in the panel",
+        default=False,
+        update=update_profiling,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "library_path")
+        row = layout.row()
+        row.prop(self, "search_depth")
+        row.prop(self, "search_timeout")
+        row = layout.row()
+        row.prop(self, "watch_library")
+        row.prop(self, "watch_interval")
+        row = layout.row()
+        row.prop(self, "preview_budget_mode")
+        row.prop(self, "preview_budget_images" if self.preview_budget_mode == 'IMAGES' else "preview_budget_mb")
+        row = layout.row()
+        row.prop(self, "thumbnail_size")
+        row.prop(self, "thumbnail_workers")
+        layout.prop(self, "search_debounce")
+        row = layout.row()
+        row.prop(self, "gallery_page_size")
+        row.prop(self, "gallery_page_window")
+        row = layout.row()
+        row.prop(self, "interactive_update_rate")
+        row.prop(self, "interactive_drag_mode")
+        row.prop(self, "drag_release_delay")
+        row = layout.row()
+        row.prop(self, "icon_load_budget_ms")
+        row.prop(self, "decode_icons_in_background")
+        row = layout.row()
+        row.prop(self, "prefetch_blend_files")
+        row.prop(self, "prefetch_neighbours")
+        layout.prop(self, "enable_profiling")
+        row = layout.row()
+        row.operator("cgh.warm_thumbnail_cache", icon='IMAGE_DATA')
+        row.operator("cgh.build_preview_atlases", icon='TEXTURE')
+        if cghood_tools is None:
+            layout.label(text="cghood_tools.py is missing next to the add-on, previews are loaded without a cache",
+                         icon='ERROR')
+        if library_discovery["source"]:
+            layout.label(
+                text=f"Library found via {library_discovery['source']} in {library_discovery['seconds']:.2f}s: "
+                     f"{library_discovery['path'] or 'not found'}",
+                icon='INFO')
 
 
 class AssetSystemProperty(bpy.types.PropertyGroup):
     category_enum: bpy.props.EnumProperty(
         name="Category",
         items=category_callback,
-        update=update_enum,
+        update=update_category,
     )
 
     asset_enum: bpy.props.EnumProperty(
@@ -298,6 +2124,13 @@ class AssetSystemProperty(bpy.types.PropertyGroup):
         update=update_enum,
     )
 
+    gallery_page: bpy.props.IntProperty(
+        name="Page",
+        default=1,
+        min=1,
+        update=update_gallery_page,
+    )
+
     winter_bool: bpy.props.BoolProperty(
         name='Winter',
         default=True,
@@ -332,9 +2165,16 @@ class AssetSystemProperty(bpy.types.PropertyGroup):
 
     search_str: bpy.props.StringProperty(
         name='Search',
-        update=update_filters,
+        update=update_search,
     )
     
+    rank_results: bpy.props.BoolProperty(
+        name="Best matches first",
+        description="List assets whose name starts with or contains the search as a whole word first",
+        default=False,
+        update=update_filters,
+    )
+
     filters: bpy.props.BoolProperty(
         name="Filter assets",
         default=False,
@@ -356,6 +2196,19 @@ class AssetSystemProperty(bpy.types.PropertyGroup):
         name="",
         items=secondary_trunk_nodes_items,
     )
+
+    main_tree_length: bpy.props.FloatProperty(
+        name="Length",
+        min=0.0,
+        get=get_main_tree_length,
+        set=set_main_tree_length,
+    )
+
+    secondary_trunk_position: bpy.props.FloatProperty(
+        name="Position",
+        get=get_secondary_trunk_position,
+        set=set_secondary_trunk_position,
+    )
     
     main_trunk_settings: bpy.props.BoolProperty(
         name="Main trunk settings",
@@ -367,11 +2220,37 @@ class AssetSystemProperty(bpy.types.PropertyGroup):
         default=False,
     )
 
+    placement_mode: bpy.props.EnumProperty(
+        name="Placement",
+        items=[
+            ('APPEND', "Append", "Append an independent copy, reusing materials, node groups and images already in the file"),
+            ('SHARED', "Shared copy", "Copy an already placed asset, sharing its mesh, node group and material data"),
+            ('INSTANCE', "Instance", "Append the asset once into the hidden CGH Library collection and place an instance of it"),
+            ('LINK', "Linked instance", "Link the asset from its .blend file and place an instance of it"),
+        ],
+        default='APPEND',
+    )
+
+    snow_amount: bpy.props.FloatProperty(
+        name="Snow",
+        description="Snow amount of every CG Hood asset whose Snow group was merged into the scene weather",
+        min=0.0,
+        max=1.0,
+        subtype='FACTOR',
+        get=get_snow_amount,
+        set=set_snow_amount,
+    )
+
     weather_settings: bpy.props.BoolProperty(
         name="Weather settings",
         default=False,
     )
 
+    performance_settings: bpy.props.BoolProperty(
+        name="Performance",
+        default=False,
+    )
+
 
 class CGH_OT_seed_control(bpy.types.Operator):
     bl_idname = "cgh.seed_control"
@@ -386,134 +2265,570 @@ class CGH_OT_seed_control(bpy.types.Operator):
     )
 
     def execute(self, context):
-        obj = context.active_object
-        scene = context.scene
-        myproperty = scene.my_property
-        if obj and "CGH0" in obj.name:
-            tree = obj.modifiers.get('Tree')
-            if tree:
-                node_test = tree.node_group
-                for node in node_test.nodes:
-                    if node.name.startswith('Secondary Trunk') or node.name == 'Main Tree':
-                        if self.action == 'RANDOMIZE':
-                            random_seed = random.randint(0, 1000000)
-                            node.inputs[1].default_value = random_seed
-                            myproperty.seed_value = random_seed
-                        elif self.action == 'RESET':
-                            default_seed = 0
-                            node.inputs[1].default_value = default_seed
-                            myproperty.seed_value = default_seed
+        roles = get_node_roles(context.active_object)
+        if roles and roles["seed_nodes"]:
+            if self.action == 'RANDOMIZE':
+                context.scene.my_property.seed_value = random.randint(0, 1000000)
+            elif self.action == 'RESET':
+                context.scene.my_property.seed_value = 0
         return {'FINISHED'}
-    
+
+
+class CGH_OT_gallery_page(bpy.types.Operator):
+    bl_idname = "cgh.gallery_page"
+    bl_label = "Change gallery page"
+    bl_options = {'INTERNAL'}
+
+    direction: bpy.props.EnumProperty(
+        items=[
+            ('NEXT', "Next", "Show the next page of assets"),
+            ('PREVIOUS', "Previous", "Show the previous page of assets"),
+        ],
+        name="Direction",
+    )
+
+    def execute(self, context):
+        page = get_gallery_page() + (1 if self.direction == 'NEXT' else -1)
+        page_count = get_page_count(len(get_iconfiles() or ()), get_gallery_page_size())
+        if not 0 <= page < page_count:
+            return {'CANCELLED'}
+        context.scene.my_property.gallery_page = page + 1
+        return {'FINISHED'}
+
+
+BATCH_PARAMETERS = {
+    'SEED': ("seed_nodes", 1),
+    'LENGTH': ("main_tree", 4),
+    'POSITION': ("secondary_trunks", 3),
+}
+
+
+def index_fraction(*values):
+    return zlib.crc32(":".join(map(str, values)).encode()) / 0xFFFFFFFF
+
+
+def get_cgh_objects(context, scope):
+    objects = context.selected_objects if scope == 'SELECTED' else context.scene.objects
+    return sorted((obj for obj in objects if "CGH0" in obj.name), key=lambda obj: obj.name)
+
+
+class CGH_OT_batch_edit(bpy.types.Operator):
+    bl_idname = "cgh.batch_edit"
+    bl_label = "Batch edit trees"
+    bl_description = "Set the seed or a tree parameter of many CG Hood assets at once"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    scope: bpy.props.EnumProperty(
+        name="Objects",
+        items=[
+            ('SELECTED', "Selected", "Edit the selected CG Hood assets"),
+            ('SCENE', "Scene", "Edit every CG Hood asset of the scene"),
+        ],
+        default='SELECTED',
+    )
+
+    parameter: bpy.props.EnumProperty(
+        name="Parameter",
+        items=[
+            ('SEED', "Seed", "Seed of the Main Tree and Secondary Trunk nodes"),
+            ('LENGTH', "Main tree length", "Length of the Main Tree node"),
+            ('POSITION', "Secondary trunk position", "Position of every Secondary Trunk node"),
+        ],
+        default='SEED',
+    )
+
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        items=[
+            ('DETERMINISTIC', "Deterministic", "Derive each value from the base seed and the object index, reproducibly"),
+            ('RANDOM', "Random", "Pick a new random value for each object"),
+            ('FIXED', "Fixed", "Give every object the same value"),
+        ],
+        default='DETERMINISTIC',
+    )
+
+    base_seed: bpy.props.IntProperty(name="Base seed", default=0, min=0)
+
+    value: bpy.props.FloatProperty(name="Value", default=1.0)
+
+    min_value: bpy.props.FloatProperty(name="Min", default=0.0)
+
+    max_value: bpy.props.FloatProperty(name="Max", default=1.0)
+
+    def get_value(self, *index):
+        if self.parameter == 'SEED':
+            if self.mode == 'RANDOM':
+                return random.randint(0, 1000000)
+            if self.mode == 'FIXED':
+                return self.base_seed
+            return (self.base_seed + zlib.crc32(":".join(map(str, index)).encode())) % 1000001
+        if self.mode == 'RANDOM':
+            return random.uniform(self.min_value, self.max_value)
+        if self.mode == 'FIXED':
+            return self.value
+        return self.min_value + index_fraction(self.base_seed, *index) * (self.max_value - self.min_value)
+
+    def execute(self, context):
+        role, input_index = BATCH_PARAMETERS[self.parameter]
+        objects = get_cgh_objects(context, self.scope)
+        node_trees = set()
+        writes = []
+        for obj in objects:
+            roles = get_node_roles(obj)
+            if not roles or roles["node_tree"] in node_trees:
+                continue
+            node_trees.add(roles["node_tree"])
+            nodes = roles.get(role)
+            nodes = nodes if isinstance(nodes, list) else [nodes] if nodes else []
+            tree_index = len(node_trees) - 1
+            if self.parameter == 'SEED':
+                seed = self.get_value(tree_index)
+                writes.extend((node.inputs[input_index], seed) for node in nodes)
+            else:
+                writes.extend((node.inputs[input_index], self.get_value(tree_index, node_index))
+                              for node_index, node in enumerate(nodes))
+
+        changed = 0
+        for socket, value in writes:
+            if socket.default_value != value:
+                socket.default_value = value
+                changed += 1
+        self.report({'INFO'}, f"{changed} values changed on {len(node_trees)} trees ({len(objects)} objects)")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "scope", expand=True)
+        layout.prop(self, "parameter")
+        layout.prop(self, "mode")
+        if self.mode != 'RANDOM':
+            layout.prop(self, "base_seed" if self.parameter == 'SEED' or self.mode == 'DETERMINISTIC' else "value")
+        if self.parameter != 'SEED' and self.mode != 'FIXED':
+            row = layout.row(align=True)
+            row.prop(self, "min_value")
+            row.prop(self, "max_value")
+
+
+BAKED_MESH_PREFIX = "CGH baked "
+
+
+def get_bake_folder():
+    return bpy.utils.user_resource('DATAFILES', path=os.path.join("cg_hood", "geometry"), create=True)
+
+
+def compute_bake_key(obj, roles):
+    node_tree = roles["node_tree"]
+    source = node_tree.get("cgh_source", "")
+    values = [get_unsuffixed_name(obj.name) or obj.name, source or node_tree.name,
+              os.path.getmtime(source) if source and os.path.exists(source) else 0.0]
+    values.extend(node.inputs[1].default_value for node in roles["seed_nodes"])
+    if "main_tree" in roles:
+        values.append(round(roles["main_tree"].inputs[4].default_value, 6))
+    values.extend(round(node.inputs[3].default_value, 6) for node in roles["secondary_trunks"])
+    values.append(round(roles["snow"].outputs[0].default_value, 6) if roles["snow"] else 0.0)
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+
+def get_bake_key(obj, roles):
+    if "bake_key" not in roles:
+        roles["bake_key"] = compute_bake_key(obj, roles)
+    return roles["bake_key"]
+
+
+def remap_baked_datablocks(new_datablocks):
+    for data_type in SHARED_DATABLOCK_TYPES:
+        datablocks = getattr(bpy.data, data_type)
+        for datablock in new_datablocks[data_type]:
+            original_name = get_unsuffixed_name(datablock.name)
+            original = datablocks.get(original_name) if original_name else None
+            if original is None or not is_same_datablock(datablock, original):
+                continue
+            datablock.user_remap(original)
+            datablocks.remove(datablock)
+
+
+def load_baked_mesh(key):
+    name = BAKED_MESH_PREFIX + key
+    mesh = bpy.data.meshes.get(name)
+    if mesh is not None:
+        return mesh, 'SHARED'
+    path = os.path.join(get_bake_folder(), key + ".blend")
+    if not os.path.exists(path):
+        return None, None
+    existing = {data_type: set(getattr(bpy.data, data_type)) for data_type in SHARED_DATABLOCK_TYPES}
+    with bpy.data.libraries.load(path, link=False) as (data_from, data_to):
+        data_to.meshes = [mesh_name for mesh_name in data_from.meshes if mesh_name == name]
+    if not data_to.meshes or data_to.meshes[0] is None:
+        return None, None
+    mesh = data_to.meshes[0]
+    mesh.use_fake_user = False
+    remap_baked_datablocks({data_type: [datablock for datablock in getattr(bpy.data, data_type)
+                                        if datablock not in existing[data_type]]
+                            for data_type in SHARED_DATABLOCK_TYPES})
+    return mesh, 'CACHE'
+
+
+def write_baked_mesh(obj, key, depsgraph):
+    mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph), preserve_all_data_layers=True,
+                                           depsgraph=depsgraph)
+    mesh.name = BAKED_MESH_PREFIX + key
+    try:
+        bpy.data.libraries.write(os.path.join(get_bake_folder(), key + ".blend"), {mesh}, fake_user=True,
+                                 compress=True)
+    except (OSError, RuntimeError) as error:
+        print(f"CG Hood: could not write the geometry cache of {obj.name} ({error})")
+    return mesh
+
+
+def unbake_tree(obj):
+    mesh = bpy.data.meshes.get(obj.get("cgh_unbaked_mesh", ""))
+    if mesh is None:
+        return False
+    baked = obj.data
+    obj.data = mesh
+    mesh.use_fake_user = False
+    tree = obj.modifiers.get('Tree')
+    if tree:
+        tree.show_viewport = tree.show_render = True
+    del obj["cgh_bake"]
+    del obj["cgh_unbaked_mesh"]
+    if baked.users == 0:
+        bpy.data.meshes.remove(baked)
+    return True
+
+
+def bake_tree(context, obj, roles):
+    release_suspended_tree(obj)
+    key = roles["bake_key"] = compute_bake_key(obj, roles)
+    if obj.get("cgh_bake") == key:
+        return None
+    if "cgh_bake" in obj:
+        unbake_tree(obj)
+    mesh, origin = load_baked_mesh(key)
+    if mesh is None:
+        mesh, origin = write_baked_mesh(obj, key, context.evaluated_depsgraph_get()), 'EVALUATED'
+    obj.data.use_fake_user = True
+    obj["cgh_unbaked_mesh"] = obj.data.name
+    obj["cgh_bake"] = key
+    obj.data = mesh
+    tree = obj.modifiers['Tree']
+    tree.show_viewport = tree.show_render = False
+    return origin
+
+
+class CGH_OT_bake_trees(bpy.types.Operator):
+    bl_idname = "cgh.bake_trees"
+    bl_label = "Bake trees"
+    bl_description = ("Replace the Tree modifier of CG Hood assets by a cached mesh of its result, "
+                      "or restore the editable node tree")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    action: bpy.props.EnumProperty(
+        items=[
+            ('BAKE', "Bake", "Evaluate the Tree modifier once and use the cached mesh"),
+            ('UNBAKE', "Unbake", "Restore the editable Tree modifier"),
+        ],
+        default='BAKE',
+    )
+
+    scope: bpy.props.EnumProperty(
+        name="Objects",
+        items=[
+            ('SELECTED', "Selected", "Bake the selected CG Hood assets"),
+            ('SCENE', "Scene", "Bake every CG Hood asset of the scene"),
+        ],
+        default='SELECTED',
+    )
+
+    def execute(self, context):
+        apply_socket_writes()
+        objects = get_cgh_objects(context, self.scope)
+        if self.action == 'UNBAKE':
+            restored = sum(unbake_tree(obj) for obj in objects if "cgh_bake" in obj)
+            self.report({'INFO'}, f"{restored} trees restored")
+            return {'FINISHED'}
+        start_time = time.perf_counter()
+        origins = defaultdict(int)
+        for obj in objects:
+            roles = get_node_roles(obj)
+            if roles:
+                origins[bake_tree(context, obj, roles)] += 1
+        self.report({'INFO'}, f"{sum(origins.values()) - origins[None]} trees baked in "
+                              f"{time.perf_counter() - start_time:.1f}s: {origins['EVALUATED']} evaluated, "
+                              f"{origins['CACHE']} read from the cache, {origins['SHARED']} shared, "
+                              f"{origins[None]} already baked")
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        if self.action == 'UNBAKE':
+            return self.execute(context)
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        self.layout.prop(self, "scope", expand=True)
+
+
+class CGH_OT_merge_weather(bpy.types.Operator):
+    bl_idname = "cgh.merge_weather"
+    bl_label = "Share scene weather"
+    bl_description = ("Make every CG Hood material of the scene use one shared Snow group, "
+                      "driven by the scene snow amount")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        objects = get_cgh_objects(context, 'SCENE')
+        materials = get_snow_materials(objects)
+        myproperty = context.scene.my_property
+        if get_shared_snow_node() is None and "snow_amount" not in myproperty and materials:
+            value = get_snow_node(next(iter(materials))).outputs[0].default_value
+        else:
+            value = myproperty.snow_amount
+        merged, skipped = merge_snow_groups(sorted(materials, key=lambda material: material.name), value)
+        self.report({'WARNING'} if skipped else {'INFO'},
+                    f"{merged} of {len(materials)} materials now share the scene weather"
+                    + (f", {skipped} with a different Snow group skipped" if skipped else ""))
+        return {'FINISHED'}
+
+
+class CGH_OT_refresh_library(bpy.types.Operator):
+    bl_idname = "cgh.refresh_library"
+    bl_label = "Refresh library"
+    bl_description = "Rescan the asset library folders that changed since the last scan"
+
+    def execute(self, context):
+        previous_categories = get_categories()
+        changed_categories = refresh_catalog()
+        changed_categories += [category for category in refresh_asset_tables() if category not in changed_categories]
+        categories = get_categories()
+        if categories != previous_categories:
+            release_all_icons()
+            clear_caches()
+        for category in changed_categories:
+            if category in categories:
+                release_category_icons(categories.index(category))
+                invalidate_category_caches(categories.index(category))
+        refresh_filters(context.scene.my_property, context)
+        self.report({'INFO'}, f"{len(changed_categories)} categories updated")
+        return {'FINISHED'}
+
+
+class CGH_OT_reset_profile(bpy.types.Operator):
+    bl_idname = "cgh.reset_profile"
+    bl_label = "Reset timings"
+    bl_description = "Clear the collected timings and cache statistics"
+
+    def execute(self, context):
+        reset_profile()
+        return {'FINISHED'}
+
+
+class CGH_OT_export_profile(bpy.types.Operator):
+    bl_idname = "cgh.export_profile"
+    bl_label = "Export timings"
+    bl_description = "Write the collected timings to a JSON summary or a Chrome trace file"
+
+    filepath: bpy.props.StringProperty(subtype='FILE_PATH')
+
+    format: bpy.props.EnumProperty(
+        name="Format",
+        items=[
+            ('JSON', "Summary", "Call counts, latencies and cache hit rates as JSON"),
+            ('CHROME', "Chrome trace", "Every recorded call, for chrome://tracing or Perfetto"),
+        ],
+        default='JSON',
+    )
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "cg_hood_profile.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        report = get_chrome_trace() if self.format == 'CHROME' else get_profile_report()
+        try:
+            with open(bpy.path.abspath(self.filepath), "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=None if self.format == 'CHROME' else 2)
+        except OSError as error:
+            self.report({'ERROR'}, f"Could not write {self.filepath} ({error})")
+            return {'CANCELLED'}
+        self.report({'INFO'}, f"Timings written to {self.filepath}")
+        return {'FINISHED'}
+
+
+class CGH_OT_warm_thumbnail_cache(bpy.types.Operator):
+    bl_idname = "cgh.warm_thumbnail_cache"
+    bl_label = "Build thumbnail cache"
+    bl_description = "Build the downscaled thumbnails of every category ahead of time"
+
+    @classmethod
+    def poll(cls, context):
+        return cghood_tools is not None
+
+    def execute(self, context):
+        start_time = time.perf_counter()
+        thumbnail_keys = get_thumbnail_keys()
+        jobs = []
+        for category in get_categories():
+            for _, source_path, stat in get_icon_sources(category, get_asset_table(category)["files"]):
+                stat = stat_icon_source(source_path, stat)
+                if stat is None:
+                    continue
+                key, job = get_thumbnail_job(source_path, stat)
+                if key not in thumbnail_keys and job[1] not in pending_thumbnails:
+                    jobs.append(job)
+        built_paths = build_thumbnails(jobs)
+        get_thumbnail_keys.cache_clear()
+        release_all_icons()
+        self.report({'INFO'}, f"{len(built_paths)} of {len(jobs)} thumbnails built in "
+                              f"{time.perf_counter() - start_time:.1f}s")
+        return {'FINISHED'}
+
+
+class CGH_OT_build_preview_atlases(bpy.types.Operator):
+    bl_idname = "cgh.build_preview_atlases"
+    bl_label = "Build preview atlases"
+    bl_description = "Pack the previews of each category into one file that is loaded instead of the images"
+
+    @classmethod
+    def poll(cls, context):
+        return cghood_tools is not None
+
+    def execute(self, context):
+        start_time = time.perf_counter()
+        release_all_icons()
+        library_folder, thumbnail_folder, thumbnail_size = get_thumbnail_settings()
+        packed = total = 0
+        for category in get_categories():
+            category_folder = os.path.join(library_folder, category)
+            sources = cghood_tools.atlas_sources(category_folder, thumbnail_folder, thumbnail_size)
+            packed += cghood_tools.build_atlas(sources, cghood_tools.atlas_path(thumbnail_folder, category_folder),
+                                               thumbnail_size, get_thumbnail_workers())
+            total += len(sources)
+        self.report({'INFO'}, f"{packed} of {total} previews packed in {time.perf_counter() - start_time:.1f}s")
+        return {'FINISHED'}
+
+
+SECONDARY_TRUNK_LIBRARY = ("Coni", "Blendfiles", "ST Spring.blend")
+SECONDARY_TRUNK_NODE_GROUP = "GN_SECONDARY_TRUNK"
+def get_secondary_trunk_node_group():
+    node_group = bpy.data.node_groups.get(SECONDARY_TRUNK_NODE_GROUP)
+    if node_group is not None:
+        return node_group
+    file_path = os.path.join(get_assetfolder(), *SECONDARY_TRUNK_LIBRARY)
+    try:
+        with bpy.data.libraries.load(file_path, link=False) as (data_from, data_to):
+            data_to.node_groups = [name for name in data_from.node_groups if name == SECONDARY_TRUNK_NODE_GROUP]
+    except OSError as error:
+        print(f"CG Hood: could not load {file_path} ({error})")
+        return None
+    if not data_to.node_groups or data_to.node_groups[0] is None:
+        return None
+    node_group = data_to.node_groups[0]
+    node_group["cgh_source"] = file_path
+    return node_group
+
+
+def layout_tree_nodes(roles, last_x):
+    join_wood_node = roles.get("join_wood")
+    join_leaves_needles_node = roles.get("join_leaves_needles")
+    if not join_wood_node or not join_leaves_needles_node:
+        return
+    join_wood_node.location.x = last_x + 300
+    join_leaves_needles_node.location.x = join_wood_node.location.x + 150
+    for offset, role in enumerate(("wood_material", "leaves", "needles", "join_geometry", "group_output"), 1):
+        node = roles.get(role)
+        if node:
+            node.location.x = join_leaves_needles_node.location.x + 150 * offset
+
 
 class CGH_OT_add_SECONDARY_TRUNK(bpy.types.Operator):
     bl_idname = "cgh.add_secondary_trunk"
     bl_label = "Add secondary trunk"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    count: bpy.props.IntProperty(
+        name="Count",
+        description="Number of secondary trunks to add",
+        default=1,
+        min=1,
+        max=32,
+    )
 
     def execute(self, context):
-        obj = context.active_object
-        if obj and "CGH0" in obj.name:
-            tree = obj.modifiers.get('Tree')
-            if tree:
-                node_test = tree.node_group
-                
-                file_path = r"C:\Users\Anwender\OneDrive\Bureau\CG Hood\TEST\Coni\Blendfiles\ST Spring.blend"
-                inner_path = 'NodeTree'
-                object_name = "GN_SECONDARY_TRUNK"
-
-                bpy.ops.wm.append(
-                    filepath=os.path.join(file_path, inner_path, object_name),
-                    directory=os.path.join(file_path, inner_path),
-                    filename=object_name,
-                    link=False
-                )
-
-                st_node = node_test.nodes.new(type="GeometryNodeGroup")
-                st_node.node_tree = bpy.data.node_groups[object_name]
-                st_node.location = (0, 0)
-                st_node.name = "Secondary Trunk"
-                
-                st_nodes = [node for node in node_test.nodes if node.name.startswith("Secondary Trunk")]
-                st_node.location = (150 * len(st_nodes), 0)
-
-                main_tree_node = None
-                join_geometry_wood_node = None
-                join_geometry_leaves_needles_node = None
-
-                for node in node_test.nodes:
-                    if node.name == "Main Tree":
-                        main_tree_node = node
-                    if node.name == "Join Geometry Wood":
-                        join_geometry_wood_node = node
-                    if node.name == "Join Geometry Leaves/Needles":
-                        join_geometry_leaves_needles_node = node
-
-                if main_tree_node and join_geometry_wood_node and join_geometry_leaves_needles_node:
-                    node_test.links.new(main_tree_node.outputs['Secondary Trunk Output'], st_node.inputs['Geometry'])
-                    node_test.links.new(main_tree_node.outputs['Secondary Trunk Parent Radius Geometry Output'], st_node.inputs['Parent Radius'])
-                    node_test.links.new(st_node.outputs['Wood Material Geometry'], join_geometry_wood_node.inputs[0])
-                    node_test.links.new(st_node.outputs['Leaves/Needles Geometry'], join_geometry_leaves_needles_node.inputs[0])
-                    
-                join_geometry_wood_node.location.x = st_node.location.x + 300
-                join_geometry_leaves_needles_node.location.x = join_geometry_wood_node.location.x + 150
-
-                wood_material_node = node_test.nodes.get("Wood Material")
-                leaves_node = node_test.nodes.get("Leaves")
-                needles_node = node_test.nodes.get("Needles")
-                join_geometry_node = node_test.nodes.get("Join Geometry")
-                group_output_node = next(node for node in node_test.nodes if node.type == 'GROUP_OUTPUT')
-
-                if wood_material_node:
-                    wood_material_node.location.x = join_geometry_leaves_needles_node.location.x + 150
-                if leaves_node:
-                    leaves_node.location.x = join_geometry_leaves_needles_node.location.x + 300
-                if needles_node:
-                    needles_node.location.x = join_geometry_leaves_needles_node.location.x + 450
-                if join_geometry_node:
-                    join_geometry_node.location.x = join_geometry_leaves_needles_node.location.x + 600
-                if group_output_node:
-                    group_output_node.location.x = join_geometry_leaves_needles_node.location.x + 750
-
-                node_test.nodes.update()
+        roles = get_node_roles(context.active_object)
+        if not roles:
+            return {'CANCELLED'}
+
+        node_group = get_secondary_trunk_node_group()
+        if node_group is None:
+            self.report({'ERROR'}, f"{SECONDARY_TRUNK_NODE_GROUP} not found in {os.path.join(*SECONDARY_TRUNK_LIBRARY)}")
+            return {'CANCELLED'}
+
+        node_test = roles["node_tree"]
+        main_tree_node = roles.get("main_tree")
+        join_geometry_wood_node = roles.get("join_wood")
+        join_geometry_leaves_needles_node = roles.get("join_leaves_needles")
+        first_index = len(roles["secondary_trunks"]) + 1
+
+        for i in range(first_index, first_index + self.count):
+            st_node = node_test.nodes.new(type="GeometryNodeGroup")
+            st_node.node_tree = node_group
+            st_node.name = "Secondary Trunk"
+            st_node.location = (150 * i, 0)
+            last_x = st_node.location.x
+
+            if main_tree_node and join_geometry_wood_node and join_geometry_leaves_needles_node:
+                node_test.links.new(main_tree_node.outputs['Secondary Trunk Output'], st_node.inputs['Geometry'])
+                node_test.links.new(main_tree_node.outputs['Secondary Trunk Parent Radius Geometry Output'], st_node.inputs['Parent Radius'])
+                node_test.links.new(st_node.outputs['Wood Material Geometry'], join_geometry_wood_node.inputs[0])
+                node_test.links.new(st_node.outputs['Leaves/Needles Geometry'], join_geometry_leaves_needles_node.inputs[0])
+
+        layout_tree_nodes(roles, last_x)
+        node_test.nodes.update()
+        invalidate_node_roles(node_test)
 
         return {'FINISHED'}
 
 
-
 class CGH_OT_remove_SECONDARY_TRUNK(bpy.types.Operator):
     bl_idname = "cgh.remove_secondary_trunk"
     bl_label = "Remove secondary trunk"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    count: bpy.props.IntProperty(
+        name="Count",
+        description="Number of secondary trunks to remove, starting at the selected one",
+        default=1,
+        min=1,
+        max=32,
+    )
 
     def execute(self, context):
-        obj = context.active_object
         scene = context.scene
-        if obj and "CGH0" in obj.name:
-            tree = obj.modifiers.get('Tree')
-            if tree:
-                node_test = tree.node_group
-                selected_node_index = int(scene.my_property.secondary_trunk_nodes)
-                selected_node = None
-
-                secondary_trunk_nodes = [node for node in node_test.nodes if node.name.startswith('Secondary Trunk')]
-                
-                if not secondary_trunk_nodes:
-                    return {'CANCELLED'}
-                
-                if 0 <= selected_node_index < len(secondary_trunk_nodes):
-                    selected_node = secondary_trunk_nodes[selected_node_index]
-
-                if selected_node:
-                    new_selected_index = selected_node_index - 1 if selected_node_index > 0 else selected_node_index + 1
-
-                    node_test.nodes.remove(selected_node)
-                    node_test.nodes.update()
-
-                    secondary_trunk_nodes = [node for node in node_test.nodes if node.name.startswith('Secondary Trunk')]
-                    if secondary_trunk_nodes:
-                        scene.my_property.secondary_trunk_nodes = str(new_selected_index % len(secondary_trunk_nodes))
-                    else:
-                        scene.my_property.secondary_trunk_nodes = '0'
+        roles = get_node_roles(context.active_object)
+        if not roles:
+            return {'CANCELLED'}
+
+        node_test = roles["node_tree"]
+        selected_node_index = int(scene.my_property.secondary_trunk_nodes)
+        secondary_trunk_nodes = roles["secondary_trunks"]
+
+        if not 0 <= selected_node_index < len(secondary_trunk_nodes):
+            return {'CANCELLED'}
+
+        removed_nodes = secondary_trunk_nodes[selected_node_index:selected_node_index + self.count]
+        invalidate_node_roles(node_test)
+        for node in removed_nodes:
+            node_test.nodes.remove(node)
+        node_test.nodes.update()
 
+        remaining = len(secondary_trunk_nodes) - len(removed_nodes)
+        new_selected_index = selected_node_index - 1 if selected_node_index > 0 else selected_node_index
+        scene.my_property.secondary_trunk_nodes = str(new_selected_index % remaining) if remaining else '0'
 
         return {'FINISHED'}
 
@@ -525,6 +2840,7 @@ class AssetSystemPanel(bpy.types.Panel):
     bl_region_type = 'UI'
     bl_category = "CG Hood"
 
+    @profiled
     def draw(self, context):
         layout = self.layout
         row = layout.row()
@@ -532,66 +2848,57 @@ class AssetSystemPanel(bpy.types.Panel):
         myproperty = scene.my_property
         row.scale_y = 2.5
         row.operator("wm.selectasset")
+        layout.operator("cgh.batch_edit", icon='MOD_ARRAY')
+        layout.operator("cgh.scatter_instances", icon='OUTLINER_OB_GROUP_INSTANCE')
+        layout.operator("cgh.bake_trees", icon='MESH_DATA').action = 'BAKE'
+        if get_shared_snow_node() is not None:
+            layout.prop(myproperty, "snow_amount", text="Scene snow")
+        for category, loaded, total in get_loading_progress():
+            layout.label(text=f"Loading {category} previews: {loaded}/{total}", icon='TIME')
 
-        obj = context.active_object
-        
-        if obj and "CGH0" in obj.name:
-            tree = None
-            if obj:
-                tree = obj.modifiers.get('Tree')
-            if tree:
-                node_test = tree.node_group
-                wood_material_node = None
-                seed_control_node = None
-
-                for n in node_test.nodes:
-                    if n.name == 'Wood Material':
-                        wood_material_node = n
-                    if n.name.startswith('Secondary Trunk') or n.name == 'Main Tree':
-                        seed_control_node = n
-                    if wood_material_node and seed_control_node:
-                        break
-                    
-                if wood_material_node: 
-                    row = layout.row(align=True)
-                    row.prop(myproperty, "general_settings", icon='DOWNARROW_HLT' if myproperty.general_settings else 'RIGHTARROW', emboss=False, icon_only=True)
-                    row.label(text="General tree settings:")
-                    if myproperty.general_settings:
-                        column = layout.column()
-                        material_box = column.box()
-                        material_box.label(text="Material control:")
-                        material_box.prop(wood_material_node.inputs[2], 'default_value', text="Material")
-                        material_box.prop(wood_material_node.inputs[1], 'default_value', text="UV visualisation")
-                        
-                        column.separator()
-                            
-                        if seed_control_node:
-                            seed_box = column.box()
-                            seed_box.label(text="Seed control:")
-                            seed_box.prop(myproperty, 'seed_value', text="Value")
-                            row = seed_box.row(align=True)
-                            row.operator("cgh.seed_control", text="Randomize", icon="ANIM").action = 'RANDOMIZE'
-                            row.separator()
-                            row.operator("cgh.seed_control", text="Reset", icon="FILE_REFRESH").action = 'RESET'
-                        
-            layout.separator()
-            
-            tree = None
-            if obj:
-                tree = obj.modifiers.get('Tree')
-            if tree:
+        roles = get_node_roles(context.active_object)
+
+        if roles and "cgh_bake" in context.active_object:
+            box = layout.box()
+            box.label(text="Baked tree geometry", icon='CHECKMARK')
+            if get_bake_key(context.active_object, roles) != context.active_object["cgh_bake"]:
+                box.label(text="Parameters changed since the bake", icon='ERROR')
+            box.operator("cgh.bake_trees", text="Unbake to edit", icon='MOD_NODES').action = 'UNBAKE'
+        elif roles:
+            wood_material_node = roles.get("wood_material")
+            if wood_material_node:
                 row = layout.row(align=True)
-                row.prop(myproperty, "main_trunk_settings", icon='DOWNARROW_HLT' if myproperty.main_trunk_settings else 'RIGHTARROW', emboss=False, icon_only=True)
-                row.label(text="Main trunk settings:")
-                if myproperty.main_trunk_settings:
-                    node_test = tree.node_group
-                    node = node_test.nodes['Main Tree']
-                        
+                row.prop(myproperty, "general_settings", icon='DOWNARROW_HLT' if myproperty.general_settings else 'RIGHTARROW', emboss=False, icon_only=True)
+                row.label(text="General tree settings:")
+                if myproperty.general_settings:
                     column = layout.column()
-                    column.prop(node.inputs[4], 'default_value', text="Lenght")
-                
+                    material_box = column.box()
+                    material_box.label(text="Material control:")
+                    material_box.prop(wood_material_node.inputs[2], 'default_value', text="Material")
+                    material_box.prop(wood_material_node.inputs[1], 'default_value', text="UV visualisation")
+
+                    column.separator()
+
+                    if roles["seed_nodes"]:
+                        seed_box = column.box()
+                        seed_box.label(text="Seed control:")
+                        seed_box.prop(myproperty, 'seed_value', text="Value")
+                        row = seed_box.row(align=True)
+                        row.operator("cgh.seed_control", text="Randomize", icon="ANIM").action = 'RANDOMIZE'
+                        row.separator()
+                        row.operator("cgh.seed_control", text="Reset", icon="FILE_REFRESH").action = 'RESET'
+
             layout.separator()
-            
+
+            row = layout.row(align=True)
+            row.prop(myproperty, "main_trunk_settings", icon='DOWNARROW_HLT' if myproperty.main_trunk_settings else 'RIGHTARROW', emboss=False, icon_only=True)
+            row.label(text="Main trunk settings:")
+            if myproperty.main_trunk_settings and "main_tree" in roles:
+                column = layout.column()
+                column.prop(myproperty, "main_tree_length", text="Lenght")
+
+            layout.separator()
+
             row = layout.row(align=True)
             row.prop(myproperty, "secondary_trunk_settings", icon='DOWNARROW_HLT' if myproperty.secondary_trunk_settings else 'RIGHTARROW', emboss=False, icon_only=True)
             row.label(text="Secondary trunk settings:")
@@ -600,71 +2907,380 @@ class AssetSystemPanel(bpy.types.Panel):
                 box.scale_y = 1.5
                 box.operator("cgh.add_secondary_trunk", icon="ADD")
                 box.operator("cgh.remove_secondary_trunk", icon="REMOVE")
-        
-                if myproperty.secondary_trunk_nodes == "":
-                    selected_node_index = -1
-                else:
-                    selected_node_index = int(myproperty.secondary_trunk_nodes)
-
-                secondary_trunk_nodes_list = secondary_trunk_nodes_items(self, context)
-                
-                if len(secondary_trunk_nodes_list) == 1 and secondary_trunk_nodes_list[0][1] == "No secondary trunk":
-                    row = layout.row()
-                else:
-                    layout.prop(myproperty, "secondary_trunk_nodes")
-                    selected_node = None
 
-                    filtered_nodes = [node for node in node_test.nodes if node.name.startswith('Secondary Trunk')]
-
-                    for i, node in enumerate(filtered_nodes):
-                        if i == selected_node_index:
-                            selected_node = node
-                            break
-                        
-                    if selected_node:
+                secondary_trunk_nodes = roles["secondary_trunks"]
+                if secondary_trunk_nodes:
+                    layout.prop(myproperty, "secondary_trunk_nodes")
+                    if 0 <= get_selected_trunk_index(myproperty) < len(secondary_trunk_nodes):
                         column = layout.column()
-                        column.prop(selected_node.inputs[3], 'default_value', text="Position")
-                                    
+                        column.prop(myproperty, "secondary_trunk_position", text="Position")
+
             layout.separator()
-                            
-            snow = None
-            if obj and obj.material_slots:
-                if len(obj.material_slots) > 0 and obj.material_slots[0].material:
-                    snow = obj.material_slots[0].material.node_tree.nodes['Snow'].node_tree.nodes['Value.002']
+
+            snow = roles["snow"]
             if snow:
                 row = layout.row(align=True)
                 row.prop(myproperty, "weather_settings", icon='DOWNARROW_HLT' if myproperty.weather_settings else 'RIGHTARROW', emboss=False, icon_only=True)
                 row.label(text="Weather settings:")
                 if myproperty.weather_settings:
                     row = layout.row()
-                    row.prop(snow.outputs[0], 'default_value', text="Snow")
-                
+                    if snow.id_data.name == SHARED_SNOW_GROUP:
+                        row.prop(myproperty, "snow_amount", text="Snow (scene)")
+                    else:
+                        row.prop(snow.outputs[0], 'default_value', text="Snow")
+                        row.operator("cgh.merge_weather", text="", icon='WORLD')
+
         else:
             row = layout.row()
             row.alignment = 'CENTER'
             row.label(text="No CG HOOD asset selected", icon='INFO')
 
+        layout.separator()
+        row = layout.row(align=True)
+        row.prop(myproperty, "performance_settings", icon='DOWNARROW_HLT' if myproperty.performance_settings else 'RIGHTARROW', emboss=False, icon_only=True)
+        row.label(text="Performance:")
+        if myproperty.performance_settings:
+            self.draw_performance(context)
+
+    def draw_performance(self, context):
+        box = self.layout.box()
+        preferences = get_preferences()
+        if preferences:
+            box.prop(preferences, "enable_profiling")
+        report = get_profile_report()
+        column = box.column(align=True)
+        for name, stats in report["functions"].items():
+            column.label(text=f"{name}: {stats['calls']} calls, {stats['total_ms']:.1f} ms, "
+                              f"p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms")
+        if not report["functions"]:
+            column.label(text="No timings collected")
+        column = box.column(align=True)
+        for name, stats in report["caches"].items():
+            column.label(text=f"{name} cache: {stats['hit_rate']:.0%} hits "
+                              f"({stats['hits']}/{stats['hits'] + stats['misses']}), {stats['size']} entries")
+        refresh = report["refresh"]
+        column.label(text=f"Refreshes: {refresh['recomputes']} of {refresh['requests']} requests")
+        prefetch = report["prefetch"]
+        column.label(text=f"Read-ahead: {prefetch['hits']} hits, {prefetch['partial']} in progress, "
+                          f"{prefetch['misses']} misses, {prefetch['cancelled']} cancelled, "
+                          f"{prefetch['bytes'] / 1024 / 1024:.0f} MB read")
+        row = box.row(align=True)
+        row.operator("cgh.export_profile", icon='EXPORT')
+        row.operator("cgh.reset_profile", icon='TRASH')
+
+
+SHARED_DATABLOCK_TYPES = ("node_groups", "materials", "images")
+LIBRARY_COLLECTION_NAME = "CGH Library"
+
+
+def get_unsuffixed_name(name):
+    match = re.match(r"^(.*)\.\d{3}$", name)
+    return match.group(1) if match else None
+
+
+def get_socket_signature(socket):
+    value = getattr(socket, "default_value", None)
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, bpy.types.ID):
+        return value.name
+    try:
+        return tuple(round(component, 6) for component in value)
+    except TypeError:
+        return None
+
+
+def get_node_tree_signature(node_tree, variable_nodes=()):
+    nodes = sorted(((node.name, node.bl_idname,
+                     getattr(getattr(node, "node_tree", None), "name", None),
+                     getattr(getattr(node, "image", None), "filepath", None),
+                     tuple(getattr(node, prop, None) for prop in ("operation", "blend_type", "data_type")),
+                     tuple(get_socket_signature(socket) for socket in node.inputs),
+                     () if node.name in variable_nodes
+                     else tuple(get_socket_signature(socket) for socket in node.outputs))
+                    for node in node_tree.nodes), key=repr)
+    links = sorted((link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+                   for link in node_tree.links)
+    return nodes, links
+
+
+def is_same_datablock(datablock, original, variable_nodes=()):
+    if isinstance(datablock, bpy.types.Image):
+        return datablock.filepath == original.filepath
+    node_tree = getattr(datablock, "node_tree", datablock)
+    original_node_tree = getattr(original, "node_tree", original)
+    if node_tree is None or original_node_tree is None:
+        return node_tree is original_node_tree
+    if len(node_tree.nodes) != len(original_node_tree.nodes):
+        return False
+    return (get_node_tree_signature(node_tree, variable_nodes)
+            == get_node_tree_signature(original_node_tree, variable_nodes))
+
+
+def get_tree_node_groups(collection):
+    return {modifier.node_group for obj in collection.all_objects for modifier in obj.modifiers
+            if modifier.type == 'NODES' and modifier.name == 'Tree' and modifier.node_group}
+
+
+def reuse_shared_datablocks(new_datablocks, collection, file_path):
+    unique_node_groups = get_tree_node_groups(collection)
+    reused = 0
+    for data_type in SHARED_DATABLOCK_TYPES:
+        datablocks = getattr(bpy.data, data_type)
+        for datablock in new_datablocks[data_type]:
+            original_name = get_unsuffixed_name(datablock.name)
+            original = datablocks.get(original_name) if original_name else None
+            if (datablock in unique_node_groups or original is None or "cgh_source" not in original
+                    or not is_same_datablock(datablock, original)):
+                datablock["cgh_source"] = file_path
+                continue
+            datablock.user_remap(original)
+            datablocks.remove(datablock)
+            reused += 1
+    return reused
+
+
+def get_imported_collection(file_path, object_name, kind='APPEND'):
+    collection = bpy.data.collections.get(imported_collections.get((file_path, object_name, kind), ""))
+    if collection is not None and collection.get("cgh_source") == file_path and collection.all_objects:
+        return collection
+    imported_collections.pop((file_path, object_name, kind), None)
+    return None
+
+
+def append_asset_collection(file_path, object_name, kind='APPEND'):
+    existing = {data_type: set(getattr(bpy.data, data_type)) for data_type in SHARED_DATABLOCK_TYPES}
+    with bpy.data.libraries.load(file_path, link=False) as (data_from, data_to):
+        data_to.collections = [name for name in data_from.collections if name == object_name]
+    if not data_to.collections or data_to.collections[0] is None:
+        return None, 0
+    collection = data_to.collections[0]
+    if get_shared_snow_node() is not None:
+        _, skipped = merge_snow_groups(get_snow_materials(collection.all_objects))
+        if skipped:
+            print(f"CG Hood: {skipped} Snow groups of {object_name} differ from {SHARED_SNOW_GROUP} "
+                  f"and keep their own amount")
+    new_datablocks = {data_type: [datablock for datablock in getattr(bpy.data, data_type)
+                                  if datablock not in existing[data_type]]
+                      for data_type in SHARED_DATABLOCK_TYPES}
+    reused = reuse_shared_datablocks(new_datablocks, collection, file_path)
+    collection["cgh_source"] = file_path
+    imported_collections[(file_path, object_name, kind)] = collection.name
+    return collection, reused
+
+
+def copy_asset_collection(source):
+    collection = bpy.data.collections.new(source.name)
+    collection["cgh_source"] = source["cgh_source"]
+    copies = {}
+    for obj in source.all_objects:
+        copies[obj] = obj.copy()
+        collection.objects.link(copies[obj])
+    for obj, copy in copies.items():
+        if obj.parent in copies:
+            copy.parent = copies[obj.parent]
+    return collection
+
+
+def get_library_collection(context):
+    library = bpy.data.collections.get(LIBRARY_COLLECTION_NAME)
+    if library is None:
+        library = bpy.data.collections.new(LIBRARY_COLLECTION_NAME)
+    if library.name not in context.scene.collection.children:
+        context.scene.collection.children.link(library)
+    layer_collection = context.view_layer.layer_collection.children.get(library.name)
+    if layer_collection is not None:
+        layer_collection.exclude = True
+    return library
+
+
+def link_asset_collection(file_path, object_name):
+    for collection in bpy.data.collections:
+        if (collection.library is not None and collection.name == object_name
+                and os.path.normpath(bpy.path.abspath(collection.library.filepath)) == os.path.normpath(file_path)):
+            return collection
+    with bpy.data.libraries.load(file_path, link=True) as (data_from, data_to):
+        data_to.collections = [name for name in data_from.collections if name == object_name]
+    return data_to.collections[0] if data_to.collections else None
+
+
+def get_instance_source(context, file_path, object_name, link):
+    if link:
+        return link_asset_collection(file_path, object_name), 0
+    source = get_imported_collection(file_path, object_name, 'INSTANCE')
+    if source is not None:
+        return source, 0
+    source, reused = append_asset_collection(file_path, object_name, 'INSTANCE')
+    if source is not None:
+        get_library_collection(context).children.link(source)
+    return source, reused
+
+
+def new_collection_instance(source, matrix):
+    instance = bpy.data.objects.new(source.name, None)
+    instance.instance_type = 'COLLECTION'
+    instance.instance_collection = source
+    instance.matrix_world = matrix
+    return instance
+
+
+def get_scatter_matrices(surface, selected_only, align_to_normal, random_rotation, min_scale, max_scale, seed):
+    matrix_world = surface.matrix_world
+    normal_matrix = matrix_world.to_3x3().inverted_safe().transposed()
+    matrices = []
+    for vertex in surface.data.vertices:
+        if selected_only and not vertex.select:
+            continue
+        if align_to_normal:
+            rotation = (normal_matrix @ vertex.normal).normalized().to_track_quat('Z', 'Y').to_matrix().to_4x4()
+        else:
+            rotation = Matrix.Identity(4)
+        if random_rotation:
+            rotation = rotation @ Matrix.Rotation(index_fraction(seed, vertex.index, "rotation") * math.tau, 4, 'Z')
+        scale = min_scale + index_fraction(seed, vertex.index, "scale") * (max_scale - min_scale)
+        matrices.append(Matrix.Translation(matrix_world @ vertex.co) @ rotation
+                        @ Matrix.Diagonal((scale, scale, scale, 1.0)))
+    return matrices
+
+
+def select_objects(context, objects):
+    for obj in context.selected_objects:
+        obj.select_set(False)
+    for obj in objects:
+        obj.select_set(True)
+    if objects:
+        context.view_layer.objects.active = objects[0]
+
+
+def place_asset(context, file_path, object_name, mode):
+    if mode in ('INSTANCE', 'LINK'):
+        source, reused = get_instance_source(context, file_path, object_name, mode == 'LINK')
+        if source is None:
+            return None, 0
+        instance = new_collection_instance(source, Matrix.Translation(context.scene.cursor.location))
+        context.collection.objects.link(instance)
+        select_objects(context, [instance])
+        return source, reused
+    source = get_imported_collection(file_path, object_name)
+    reused = 0
+    if mode == 'SHARED' and source is not None:
+        collection = copy_asset_collection(source)
+    else:
+        collection, reused = append_asset_collection(file_path, object_name)
+        if collection is None:
+            return None, 0
+    context.collection.children.link(collection)
+    select_objects(context, list(collection.all_objects))
+    return collection, reused
+
+
+class CGH_OT_scatter_instances(bpy.types.Operator):
+    bl_idname = "cgh.scatter_instances"
+    bl_label = "Scatter instances"
+    bl_description = ("Place an instance of the selected asset on each vertex of the active mesh. "
+                      "Every instance shares one copy of the asset, so it is evaluated only once")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    source: bpy.props.EnumProperty(
+        name="Source",
+        items=[
+            ('INSTANCE', "Library copy", "Append the asset once into the hidden CGH Library collection"),
+            ('LINK', "Linked", "Link the asset collection from its .blend file"),
+        ],
+        default='INSTANCE',
+    )
+
+    vertices: bpy.props.EnumProperty(
+        name="Vertices",
+        items=[
+            ('ALL', "All", "Place an instance on every vertex"),
+            ('SELECTED', "Selected", "Place instances only on the selected vertices"),
+        ],
+        default='ALL',
+    )
+
+    align_to_normal: bpy.props.BoolProperty(name="Align to normal", default=False)
+
+    random_rotation: bpy.props.BoolProperty(name="Random rotation", default=True)
+
+    seed: bpy.props.IntProperty(name="Seed", default=0, min=0)
+
+    min_scale: bpy.props.FloatProperty(name="Min scale", default=1.0, min=0.001)
+
+    max_scale: bpy.props.FloatProperty(name="Max scale", default=1.0, min=0.001)
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and get_object() is not None
+
+    def execute(self, context):
+        surface = context.active_object
+        if surface.mode == 'EDIT':
+            surface.update_from_editmode()
+        object_name = get_object()
+        file_path = get_blendfileslist()
+        start_time = time.perf_counter()
+        source, reused = get_instance_source(context, file_path, object_name, self.source == 'LINK')
+        if source is None:
+            self.report({'ERROR'}, f"Collection \"{object_name}\" not found in {file_path}")
+            return {'CANCELLED'}
+        matrices = get_scatter_matrices(surface, self.vertices == 'SELECTED', self.align_to_normal,
+                                        self.random_rotation, self.min_scale, self.max_scale, self.seed)
+        if not matrices:
+            self.report({'WARNING'}, f"No {'selected ' if self.vertices == 'SELECTED' else ''}vertices on {surface.name}")
+            return {'CANCELLED'}
+        scatter = bpy.data.collections.new(f"{object_name} scatter")
+        context.collection.children.link(scatter)
+        for matrix in matrices:
+            scatter.objects.link(new_collection_instance(source, matrix))
+        elapsed = time.perf_counter() - start_time
+        self.report({'INFO'}, f"Placed {len(matrices)} instances of {object_name} in {elapsed * 1000:.0f} ms"
+                              + (f", {reused} shared datablocks reused" if reused else ""))
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.label(text=f"Asset : {get_object()}")
+        layout.prop(self, "source", expand=True)
+        layout.prop(self, "vertices", expand=True)
+        layout.prop(self, "align_to_normal")
+        layout.prop(self, "random_rotation")
+        layout.prop(self, "seed")
+        row = layout.row(align=True)
+        row.prop(self, "min_scale")
+        row.prop(self, "max_scale")
+
 
 class WM_OT_SelectAssetOP(bpy.types.Operator):
     bl_label = "Select asset"
     bl_idname = "wm.selectasset"
     bl_options = {'REGISTER', 'INTERNAL'}
 
+    @profiled
     def execute(self, context):
         object_name = get_object()
         if object_name is None:
             return {"CANCELLED"}
         
         file_path = get_blendfileslist()
-        inner_path = 'Collection'
-
-        bpy.ops.wm.append(
-            filepath=os.path.join(file_path, inner_path, object_name),
-            directory=os.path.join(file_path, inner_path),
-            filename=object_name,
-            link=False
-        )
+        record_prefetch_use(file_path)
+        request_blend_prefetch([])
+        mode = context.scene.my_property.placement_mode
+        start_time = time.perf_counter()
+        collection, reused = place_asset(context, file_path, object_name, mode)
+        elapsed = time.perf_counter() - start_time
+        if collection is None:
+            self.report({'ERROR'}, f"Collection \"{object_name}\" not found in {file_path}")
+            return {"CANCELLED"}
 
+        self.report({'INFO'}, f"Placed {object_name} in {elapsed * 1000:.0f} ms"
+                              + (f", {reused} shared datablocks reused" if reused else ""))
         return {"FINISHED"}
     
     def invoke(self, context, event):
@@ -676,7 +3292,9 @@ class WM_OT_SelectAssetOP(bpy.types.Operator):
         scene = context.scene
         myproperty = scene.my_property
         layout.separator()
-        layout.prop(myproperty, "category_enum")
+        row = layout.row(align=True)
+        row.prop(myproperty, "category_enum")
+        row.operator("cgh.refresh_library", text="", icon="FILE_REFRESH")
         layout.separator()
         row = layout.row(align=True)
         row.prop(myproperty, "filters", icon='DOWNARROW_HLT' if myproperty.filters else 'RIGHTARROW', emboss=False, icon_only=True)
@@ -684,7 +3302,7 @@ class WM_OT_SelectAssetOP(bpy.types.Operator):
         if myproperty.filters:
             box = layout.box()
             category_name = get_categories()[get_category_index()]
-            if category_name in season_filtered_categories:
+            if get_asset_table(category_name)["seasonal"]:
                 row = box.row()
                 row.prop(myproperty, "winter_bool")
                 row.prop(myproperty, "spring_bool")
@@ -693,22 +3311,43 @@ class WM_OT_SelectAssetOP(bpy.types.Operator):
                 layout.separator()
             row = box.row()
             row.prop(myproperty, "search_str", icon="VIEWZOOM")
+            row.prop(myproperty, "rank_results", text="", icon='SORTALPHA')
         if myproperty.warning_message_filter:
             layout.label(text=myproperty.warning_message_filter, icon='ERROR') 
+        for category, loaded, total in get_loading_progress():
+            layout.label(text=f"Loading {category} previews: {loaded}/{total}", icon='TIME')
         layout.separator()
         if object_name is not None:
             layout.template_icon_view(
                 myproperty, "asset_enum", show_labels=True, scale=15.0, scale_popup=7.5)
+            page_count = get_page_count(len(get_iconfiles()), get_gallery_page_size())
+            if page_count > 1:
+                row = layout.row(align=True)
+                row.operator("cgh.gallery_page", text="", icon='TRIA_LEFT').direction = 'PREVIOUS'
+                row.prop(myproperty, "gallery_page", text=f"Page (of {page_count})")
+                row.operator("cgh.gallery_page", text="", icon='TRIA_RIGHT').direction = 'NEXT'
         layout.separator()
         layout.label(text=f"Asset : {object_name}")
+        layout.prop(myproperty, "placement_mode", expand=True)
         layout.separator()
 
 
 classes = (
+    AssetSystemPreferences,
     AssetSystemPanel,
     WM_OT_SelectAssetOP,
     AssetSystemProperty,
     CGH_OT_seed_control,
+    CGH_OT_gallery_page,
+    CGH_OT_batch_edit,
+    CGH_OT_scatter_instances,
+    CGH_OT_bake_trees,
+    CGH_OT_merge_weather,
+    CGH_OT_refresh_library,
+    CGH_OT_warm_thumbnail_cache,
+    CGH_OT_build_preview_atlases,
+    CGH_OT_reset_profile,
+    CGH_OT_export_profile,
     CGH_OT_add_SECONDARY_TRUNK,
     CGH_OT_remove_SECONDARY_TRUNK,
 )
@@ -717,7 +3356,14 @@ classes = (
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
-    load_all_icons()
+    preferences = get_preferences()
+    profiling["enabled"] = bool(preferences and preferences.enable_profiling)
+    bpy.app.timers.register(load_icons_on_startup, first_interval=0.1)
+    bpy.app.handlers.depsgraph_update_post.append(node_roles_depsgraph_handler)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handlers.append(node_roles_reset_handler)
+    for handlers in (bpy.app.handlers.load_pre, bpy.app.handlers.undo_pre, bpy.app.handlers.redo_pre):
+        handlers.append(throttle_reset_handler)
     bpy.types.Scene.my_property = bpy.props.PointerProperty(
         type=AssetSystemProperty)
 
@@ -727,9 +3373,26 @@ def unregister():
         bpy.utils.unregister_class(cls)
     del bpy.types.Scene.my_property
 
-    for pcoll in preview_collections.values():
-        bpy.utils.previews.remove(pcoll)
-    preview_collections.clear()
+    if node_roles_depsgraph_handler in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(node_roles_depsgraph_handler)
+    for handlers in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if node_roles_reset_handler in handlers:
+            handlers.remove(node_roles_reset_handler)
+    for handlers in (bpy.app.handlers.load_pre, bpy.app.handlers.undo_pre, bpy.app.handlers.redo_pre):
+        if throttle_reset_handler in handlers:
+            handlers.remove(throttle_reset_handler)
+    reset_throttle_state()
+    invalidate_node_roles()
+    stop_library_watcher()
+    stop_blend_prefetch()
+    for function in (load_icons_on_startup, drain_icon_queue, poll_thumbnail_builds, flush_refresh,
+                     apply_throttled_writes, apply_library_changes):
+        if bpy.app.timers.is_registered(function):
+            bpy.app.timers.unregister(function)
+    if icon_loader["executor"] is not None:
+        icon_loader["executor"].shutdown(wait=False, cancel_futures=True)
+        icon_loader["executor"] = None
+    release_all_icons()
 
 
 if __name__ == "__main__":
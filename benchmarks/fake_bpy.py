@@ -0,0 +1,501 @@
+import os
+import sys
+import time
+import types
+import tempfile
+import itertools
+import contextlib
+
+
+user_folder = tempfile.mkdtemp(prefix="cghood_user_")
+
+
+class _Deferred:
+    def __init__(self, kind, keywords):
+        self.kind = kind
+        self.keywords = keywords
+
+
+def _property(kind):
+    def make(**keywords):
+        return _Deferred(kind, keywords)
+    make.__name__ = kind
+    return make
+
+
+_property_defaults = {
+    "BoolProperty": False,
+    "IntProperty": 0,
+    "FloatProperty": 0.0,
+    "StringProperty": "",
+}
+
+
+def _annotations(cls):
+    result = {}
+    for klass in reversed(cls.__mro__):
+        result.update(klass.__dict__.get("__annotations__", {}))
+    return {name: prop for name, prop in result.items() if isinstance(prop, _Deferred)}
+
+
+class _Struct:
+    def __init__(self):
+        object.__setattr__(self, "_idprops", {})
+
+    def __getitem__(self, key):
+        return self._idprops[key]
+
+    def __setitem__(self, key, value):
+        self._idprops[key] = value
+
+    def __contains__(self, key):
+        return key in self._idprops
+
+    def get(self, key, default=None):
+        return self._idprops.get(key, default)
+
+    def as_pointer(self):
+        return id(self)
+
+
+class PropertyGroup(_Struct):
+    def __init__(self):
+        super().__init__()
+        object.__setattr__(self, "_values", {})
+        for name, prop in _annotations(type(self)).items():
+            if prop.kind == "PointerProperty":
+                self._values[name] = prop.keywords["type"]()
+            elif prop.kind == "CollectionProperty":
+                self._values[name] = []
+
+    def __getattr__(self, name):
+        prop = _annotations(type(self)).get(name)
+        if prop is None:
+            raise AttributeError(name)
+        if prop.keywords.get("get") is not None:
+            return prop.keywords["get"](self)
+        if name in self._values:
+            return self._values[name]
+        if prop.kind == "EnumProperty":
+            if prop.keywords.get("default") is not None:
+                return prop.keywords["default"]
+            items = prop.keywords.get("items", ())
+            if callable(items):
+                items = items(self, context)
+            return items[0][0] if items else ""
+        return prop.keywords.get("default", _property_defaults.get(prop.kind))
+
+    def __setattr__(self, name, value):
+        prop = _annotations(type(self)).get(name)
+        if prop is None:
+            object.__setattr__(self, name, value)
+            return
+        if prop.keywords.get("set") is not None:
+            prop.keywords["set"](self, value)
+        else:
+            self._values[name] = value
+        if prop.keywords.get("update") is not None:
+            prop.keywords["update"](self, context)
+
+
+class Operator(PropertyGroup):
+    def report(self, level, message):
+        self.reports.append((level, message))
+
+    @property
+    def reports(self):
+        return self._idprops.setdefault("reports", [])
+
+
+class Panel(_Struct):
+    pass
+
+
+class AddonPreferences(PropertyGroup):
+    pass
+
+
+_icon_ids = itertools.count(1)
+
+
+class _Pixels(list):
+    def foreach_set(self, values):
+        self[:] = [len(values)]
+
+
+class ImagePreview:
+    def __init__(self):
+        self.icon_id = next(_icon_ids)
+        self.image_size = (0, 0)
+        self.image_pixels = _Pixels()
+        self.image_pixels_float = _Pixels()
+        self.icon_size = (0, 0)
+        self.icon_pixels_float = _Pixels()
+
+
+class ImagePreviewCollection(dict):
+    def new(self, name):
+        preview = self[name] = ImagePreview()
+        return preview
+
+    def load(self, name, path, path_type, force_reload=False):
+        if name in self and not force_reload:
+            return self[name]
+        with open(path, "rb") as file:
+            file.read(64)
+        preview = self[name] = ImagePreview()
+        return preview
+
+    def close(self):
+        self.clear()
+
+
+class _Timers:
+    def __init__(self):
+        self.registered = {}
+
+    def register(self, function, first_interval=0.0, persistent=False):
+        self.registered[function] = time.perf_counter() + first_interval
+
+    def unregister(self, function):
+        self.registered.pop(function, None)
+
+    def is_registered(self, function):
+        return function in self.registered
+
+    def run(self, timeout=60.0):
+        deadline = time.perf_counter() + timeout
+        while self.registered and time.perf_counter() < deadline:
+            function, due = min(self.registered.items(), key=lambda item: item[1])
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            interval = function()
+            if function not in self.registered:
+                continue
+            if interval is None:
+                del self.registered[function]
+            else:
+                self.registered[function] = time.perf_counter() + interval
+
+
+class _Addon:
+    def __init__(self, preferences):
+        self.preferences = preferences
+
+
+class _Preferences:
+    def __init__(self):
+        self.addons = {}
+
+
+class _Scene(_Struct):
+    def __init__(self):
+        super().__init__()
+        self.objects = []
+
+    def __getattr__(self, name):
+        prop = getattr(bpy.types.Scene, name, None)
+        if not isinstance(prop, _Deferred):
+            raise AttributeError(name)
+        value = prop.keywords["type"]() if prop.kind == "PointerProperty" else prop.keywords.get("default")
+        object.__setattr__(self, name, value)
+        return value
+
+
+class _Context:
+    def __init__(self):
+        self.scene = _Scene()
+        self.preferences = _Preferences()
+        self.active_object = None
+        self.selected_objects = []
+        self.window_manager = None
+
+
+class _Socket:
+    def __init__(self, identifier, default_value=None):
+        self.identifier = identifier
+        self.default_value = default_value
+
+
+class _Node:
+    def __init__(self, name, bl_idname, inputs=(), outputs=(), node_tree=None):
+        self.name = name
+        self.bl_idname = bl_idname
+        self.inputs = [_Socket(f"Input_{i}", value) for i, value in enumerate(inputs)]
+        self.outputs = [_Socket(f"Output_{i}", value) for i, value in enumerate(outputs)]
+        self.node_tree = node_tree
+
+
+class _Link:
+    def __init__(self, from_node, from_socket, to_node, to_socket):
+        self.from_node = from_node
+        self.from_socket = from_socket
+        self.to_node = to_node
+        self.to_socket = to_socket
+
+
+class _Nodes(list):
+    def new(self, name, bl_idname, inputs=(), outputs=(), node_tree=None):
+        node = _Node(name, bl_idname, inputs, outputs, node_tree)
+        self.append(node)
+        return node
+
+    def get(self, name, default=None):
+        return next((node for node in self if node.name == name), default)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            node = self.get(key)
+            if node is None:
+                raise KeyError(key)
+            return node
+        return super().__getitem__(key)
+
+
+class ID(_Struct):
+    def __init__(self, name=""):
+        super().__init__()
+        self.name = name
+        self.library = None
+
+    @property
+    def users(self):
+        return len(_find_users(self))
+
+    def user_remap(self, new_id):
+        for owner, attribute in _find_users(self):
+            setattr(owner, attribute, new_id)
+
+
+class NodeTree(ID):
+    def __init__(self, name=""):
+        super().__init__(name)
+        self.nodes = _Nodes()
+        self.links = []
+
+    def link(self, from_node, to_node, from_index=0, to_index=0):
+        self.links.append(_Link(from_node, from_node.outputs[from_index], to_node, to_node.inputs[to_index]))
+
+    def copy(self):
+        copy = NodeTree(self.name)
+        for node in self.nodes:
+            copy.nodes.new(node.name, node.bl_idname, [socket.default_value for socket in node.inputs],
+                           [socket.default_value for socket in node.outputs], node.node_tree)
+        for link in self.links:
+            copy.link(copy.nodes[link.from_node.name], copy.nodes[link.to_node.name],
+                      link.from_node.outputs.index(link.from_socket), link.to_node.inputs.index(link.to_socket))
+        return bpy.data.node_groups.add(copy)
+
+
+class Material(ID):
+    def __init__(self, name=""):
+        super().__init__(name)
+        self.node_tree = NodeTree(name)
+
+
+class _MaterialSlot:
+    def __init__(self, material):
+        self.material = material
+
+
+class _Modifier:
+    def __init__(self, name, modifier_type, node_group=None):
+        self.name = name
+        self.type = modifier_type
+        self.node_group = node_group
+
+
+class _Modifiers(list):
+    def get(self, name, default=None):
+        return next((modifier for modifier in self if modifier.name == name), default)
+
+
+class Object(ID):
+    def __init__(self, name=""):
+        super().__init__(name)
+        self.material_slots = []
+        self.modifiers = _Modifiers()
+
+
+class Collection(ID):
+    def __init__(self, name=""):
+        super().__init__(name)
+        self.objects = []
+
+    @property
+    def all_objects(self):
+        return list(self.objects)
+
+
+class Image(ID):
+    filepath = ""
+
+
+class _IDCollection:
+    def __init__(self, id_type=ID):
+        self.id_type = id_type
+        self.items = []
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, name, default=None):
+        return next((item for item in self.items if item.name == name), default)
+
+    def __getitem__(self, name):
+        item = self.get(name)
+        if item is None:
+            raise KeyError(name)
+        return item
+
+    def add(self, datablock):
+        names = {item.name for item in self.items}
+        if datablock.name in names:
+            stem = datablock.name.rsplit(".", 1)[0] if datablock.name[-4:-3] == "." else datablock.name
+            datablock.name = next(f"{stem}.{i:03d}" for i in itertools.count(1) if f"{stem}.{i:03d}" not in names)
+        self.items.append(datablock)
+        return datablock
+
+    def new(self, name, *args):
+        return self.add(self.id_type(name))
+
+    def remove(self, datablock):
+        self.items.remove(datablock)
+
+
+def _find_users(datablock):
+    users = []
+    for node_tree in [material.node_tree for material in bpy.data.materials] + list(bpy.data.node_groups):
+        users.extend((node, "node_tree") for node in node_tree.nodes if node.node_tree is datablock)
+    for obj in bpy.data.objects:
+        users.extend((slot, "material") for slot in obj.material_slots if slot.material is datablock)
+        users.extend((modifier, "node_group") for modifier in obj.modifiers if modifier.node_group is datablock)
+    return users
+
+
+def append_asset(name):
+    snow = bpy.data.node_groups.new("Snow")
+    amount = snow.nodes.new("Value.002", "ShaderNodeValue", outputs=[0.0])
+    scale = snow.nodes.new("Math", "ShaderNodeMath", inputs=[0.0, 0.5], outputs=[0.0])
+    snow_output = snow.nodes.new("Group Output", "NodeGroupOutput", inputs=[0.0])
+    snow.link(amount, scale)
+    snow.link(scale, snow_output)
+    material = bpy.data.materials.new("Wood Material")
+    snow_node = material.node_tree.nodes.new("Snow", "ShaderNodeGroup", outputs=[None], node_tree=snow)
+    material.node_tree.link(snow_node, material.node_tree.nodes.new("Material Output", "ShaderNodeOutputMaterial",
+                                                                    inputs=[None]))
+    tree = bpy.data.node_groups.new("GN Tree")
+    tree.nodes.new("Main Tree", "GeometryNodeGroup", inputs=[0], outputs=[None])
+    tree.nodes.new("Group Output", "NodeGroupOutput", inputs=[None])
+    obj = bpy.data.objects.new(name)
+    obj.material_slots.append(_MaterialSlot(material))
+    obj.modifiers.append(_Modifier("Tree", 'NODES', tree))
+    collection = bpy.data.collections.new(name)
+    collection.objects.append(obj)
+    return collection
+
+
+class _Libraries(_IDCollection):
+    write = None
+
+    @contextlib.contextmanager
+    def load(self, filepath, link=False, relative=False):
+        data_from = types.SimpleNamespace(collections=[os.path.splitext(os.path.basename(filepath))[0]],
+                                          node_groups=[], meshes=[], materials=[])
+        data_to = types.SimpleNamespace(collections=[], node_groups=[], meshes=[], materials=[])
+        yield data_from, data_to
+        for attribute, names in vars(data_to).items():
+            setattr(data_to, attribute, [append_asset(name) if attribute == "collections" and name in
+                                         data_from.collections else None for name in names])
+
+
+def register_class(cls):
+    if issubclass(cls, AddonPreferences):
+        context.preferences.addons[cls.bl_idname] = _Addon(cls())
+
+
+def unregister_class(cls):
+    if issubclass(cls, AddonPreferences):
+        context.preferences.addons.pop(cls.bl_idname, None)
+
+
+def user_resource(resource_type, path="", create=False):
+    folder = os.path.join(user_folder, resource_type.lower(), path)
+    if create:
+        os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+context = _Context()
+
+bpy = types.ModuleType("bpy")
+bpy.context = context
+
+bpy.props = types.ModuleType("bpy.props")
+for _kind in ("BoolProperty", "IntProperty", "FloatProperty", "StringProperty", "EnumProperty",
+              "PointerProperty", "CollectionProperty", "FloatVectorProperty", "IntVectorProperty"):
+    setattr(bpy.props, _kind, _property(_kind))
+
+bpy.types = types.ModuleType("bpy.types")
+bpy.types.PropertyGroup = PropertyGroup
+bpy.types.Operator = Operator
+bpy.types.Panel = Panel
+bpy.types.AddonPreferences = AddonPreferences
+bpy.types.Scene = type("Scene", (), {})
+for _name in ("Mesh", "Menu", "UIList"):
+    setattr(bpy.types, _name, type(_name, (), {}))
+for _type in (ID, Object, NodeTree, Material, Collection, Image):
+    setattr(bpy.types, _type.__name__, _type)
+
+bpy.utils = types.ModuleType("bpy.utils")
+bpy.utils.previews = types.ModuleType("bpy.utils.previews")
+bpy.utils.previews.ImagePreviewCollection = ImagePreviewCollection
+bpy.utils.previews.new = ImagePreviewCollection
+bpy.utils.previews.remove = ImagePreviewCollection.close
+bpy.utils.register_class = register_class
+bpy.utils.unregister_class = unregister_class
+bpy.utils.user_resource = user_resource
+
+bpy.path = types.SimpleNamespace(abspath=lambda path: path[2:] if path.startswith("//") else path)
+
+bpy.app = types.ModuleType("bpy.app")
+bpy.app.timers = _Timers()
+bpy.app.handlers = types.SimpleNamespace(
+    depsgraph_update_post=[], load_pre=[], load_post=[], save_pre=[], undo_pre=[], undo_post=[], redo_pre=[],
+    redo_post=[],
+    persistent=lambda function: function,
+)
+bpy.app.version = (3, 4, 1)
+bpy.app.binary_path = ""
+bpy.app.background = True
+
+bpy.data = types.SimpleNamespace(
+    node_groups=_IDCollection(NodeTree), materials=_IDCollection(Material), collections=_IDCollection(Collection),
+    objects=_IDCollection(Object), meshes=_IDCollection(), images=_IDCollection(Image), libraries=_Libraries(),
+)
+bpy.msgbus = types.SimpleNamespace(subscribe_rna=lambda **keywords: None, clear_by_owner=lambda owner: None)
+bpy.ops = types.SimpleNamespace()
+
+mathutils = types.ModuleType("mathutils")
+mathutils.Matrix = type("Matrix", (), {})
+mathutils.Vector = type("Vector", (), {})
+
+
+def install():
+    modules = {
+        "bpy": bpy,
+        "bpy.props": bpy.props,
+        "bpy.types": bpy.types,
+        "bpy.utils": bpy.utils,
+        "bpy.utils.previews": bpy.utils.previews,
+        "bpy.app": bpy.app,
+        "bpy.app.timers": bpy.app.timers,
+        "bpy.app.handlers": bpy.app.handlers,
+        "mathutils": mathutils,
+    }
+    sys.modules.update(modules)
+    return bpy
@@ -0,0 +1,99 @@
+import os
+import gzip
+import struct
+import argparse
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+DEFAULT_SEASONS = ("Winter", "Spring", "Summer", "Autumn")
+SEASONAL_CATEGORIES = ("Coni", "Deci")
+PLACEHOLDER_JPEG = b"\xff\xd8\xff\xd9"
+BHEAD = struct.Struct("<4siQii")
+DNA_NAMES = ("*next", "*prev", "*newid", "*lib", "*asset_data", "name[66]", "flag")
+DNA_TYPES = (("char", 1), ("short", 2), ("void", 0), ("ID", 5 * 8 + 66 + 2))
+DNA_ID_FIELDS = ((2, 0), (2, 1), (2, 2), (2, 3), (2, 4), (0, 5), (1, 6))
+
+
+def get_category_names(category_count):
+    names = list(SEASONAL_CATEGORIES[:category_count])
+    names.extend(f"Category{i:03d}" for i in range(len(names), category_count))
+    return names
+
+
+def write_thumbnail(path, size, seed):
+    if Image is None:
+        with open(path, "wb") as file:
+            file.write(PLACEHOLDER_JPEG)
+        return
+    color = (seed * 37 % 256, seed * 91 % 256, seed * 53 % 256)
+    Image.new("RGB", (size, size * 3 // 4), color).save(path, "JPEG", quality=80)
+
+
+def pack_dna_strings(tag, strings):
+    data = tag + struct.pack("<i", len(strings)) + b"".join(string.encode() + b"\0" for string in strings)
+    return data + bytes(-len(data) % 4)
+
+
+def get_sdna():
+    sdna = b"SDNA" + pack_dna_strings(b"NAME", DNA_NAMES) + pack_dna_strings(b"TYPE", [name for name, _ in DNA_TYPES])
+    lengths = b"TLEN" + struct.pack(f"<{len(DNA_TYPES)}h", *(length for _, length in DNA_TYPES))
+    sdna += lengths + bytes(-len(lengths) % 4)
+    fields = [value for field in DNA_ID_FIELDS for value in field]
+    return sdna + b"STRC" + struct.pack("<ihh", 1, 3, len(DNA_ID_FIELDS)) + struct.pack(f"<{len(fields)}h", *fields)
+
+
+def write_blend_file(path, collections, padding=0, compress=False):
+    blocks = [b"BLENDER-v304"]
+    for index, name in enumerate(collections):
+        data = bytes(5 * 8) + (b"GR" + name.encode())[:65].ljust(66, b"\0") + bytes(2)
+        blocks.append(BHEAD.pack(b"GR\0\0", len(data), index + 1, 0, 1) + data)
+    if padding:
+        blocks.append(BHEAD.pack(b"DATA", padding, 0, 0, 1) + bytes(padding))
+    sdna = get_sdna()
+    blocks.append(BHEAD.pack(b"DNA1", len(sdna), 0, 0, 1) + sdna)
+    blocks.append(BHEAD.pack(b"ENDB", 0, 0, 0, 0))
+    with (gzip.open if compress else open)(path, "wb") as file:
+        file.write(b"".join(blocks))
+
+
+def generate_decoy_folders(root, count, depth=3):
+    for i in range(count):
+        os.makedirs(os.path.join(root, *(f"Folder{i:04d}_{level}" for level in range(depth))), exist_ok=True)
+
+
+def generate_library(root, category_count=4, assets_per_category=200, seasons=DEFAULT_SEASONS,
+                     thumbnail_size=512, nested_folders=()):
+    library_folder = os.path.join(root, *nested_folders, "CG Hood", "TEST")
+    for category_index, category in enumerate(get_category_names(category_count)):
+        icon_folder = os.path.join(library_folder, category, "Iconfiles")
+        blend_folder = os.path.join(library_folder, category, "Blendfiles")
+        os.makedirs(icon_folder, exist_ok=True)
+        os.makedirs(blend_folder, exist_ok=True)
+        for asset_index in range(assets_per_category):
+            season = seasons[asset_index % len(seasons)] if seasons else ""
+            name = f"CGH0{category_index:02d}{asset_index:05d} {category} {season}".strip()
+            write_thumbnail(os.path.join(icon_folder, name + ".jpg"), thumbnail_size, category_index * 7919 + asset_index)
+            write_blend_file(os.path.join(blend_folder, name + ".blend"), [name])
+    return library_folder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CG Hood/TEST asset library")
+    parser.add_argument("root", help="Folder in which the CG Hood folder is created")
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--assets", type=int, default=200, help="Assets per category")
+    parser.add_argument("--seasons", default=",".join(DEFAULT_SEASONS), help="Comma separated season names")
+    parser.add_argument("--thumbnail-size", type=int, default=512)
+    parser.add_argument("--decoy-folders", type=int, default=0, help="Unrelated folders created next to the library")
+    args = parser.parse_args()
+    seasons = tuple(season for season in args.seasons.split(",") if season)
+    generate_decoy_folders(args.root, args.decoy_folders)
+    print(generate_library(args.root, args.categories, args.assets, seasons, args.thumbnail_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import itertools
+import statistics
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_FOLDER)
+sys.path.insert(0, os.path.dirname(BENCHMARK_FOLDER))
+
+import fake_bpy
+import generate_library
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_FOLDER, "baseline.json")
+SEARCH_STRINGS = ("", "c", "cgh0", "00012", "coni winter", "zzz")
+NESTED_LIBRARY_FOLDERS = ("Documents", "Assets", "Vegetation")
+
+
+def measure(function, repeat, setup=None):
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start_time)
+    return {"median": statistics.median(runs), "min": min(runs), "runs": len(runs)}
+
+
+def get_filter_states():
+    seasons = itertools.product((True, False), repeat=4)
+    return [(search_str, *season_bools) for season_bools in seasons for search_str in SEARCH_STRINGS]
+
+
+def set_filter_state(my_property, search_str, winter_bool, spring_bool, summer_bool, autumn_bool):
+    my_property["winter_bool"] = winter_bool
+    my_property["spring_bool"] = spring_bool
+    my_property["summer_bool"] = summer_bool
+    my_property["autumn_bool"] = autumn_bool
+    my_property._values["search_str"] = search_str
+
+
+def remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def run_benchmarks(args, root):
+    home_folder = os.path.join(root, "home")
+    fake_bpy.user_folder = os.path.join(root, "blender_user")
+    os.environ["HOME"] = home_folder
+    os.environ.pop("CGHOOD_LIBRARY", None)
+    seasons = tuple(season for season in args.seasons.split(",") if season)
+    generate_library.generate_decoy_folders(home_folder, args.decoy_folders)
+    library_folder = generate_library.generate_library(
+        home_folder, args.categories, args.assets, seasons, args.thumbnail_size, NESTED_LIBRARY_FOLDERS)
+
+    bpy = fake_bpy.install()
+    import cghood_tools
+    import TestCode
+
+    results = {}
+    thumbnail_folder = TestCode.get_thumbnail_folder()
+    results["warm_thumbnail_cache"] = measure(
+        lambda: cghood_tools.build_thumbnails(cghood_tools.thumbnail_jobs(library_folder, thumbnail_folder)), 1)
+
+    TestCode.register()
+    preferences = bpy.context.preferences.addons["TestCode"].preferences
+    preferences.watch_library = False
+    preferences.search_debounce = 0.0
+    preferences.gallery_page_size = 0
+    preferences.preview_budget_mode = 'IMAGES'
+    preferences.preview_budget_images = args.categories * args.assets + 1
+    my_property = bpy.context.scene.my_property
+    settings_path = TestCode.get_settings_path()
+
+    def forget_library():
+        TestCode.get_assetfolder.cache_clear()
+        remove_file(settings_path)
+
+    results["get_assetfolder_search"] = measure(TestCode.get_assetfolder, args.repeat, forget_library)
+    results["get_assetfolder_known"] = measure(
+        TestCode.get_assetfolder, args.repeat, TestCode.get_assetfolder.cache_clear)
+
+    def forget_catalog():
+        TestCode.catalog.clear()
+        TestCode.get_categories.cache_clear()
+        remove_file(TestCode.get_catalog_path())
+
+    results["catalog_scan"] = measure(TestCode.get_catalog, args.repeat, forget_catalog)
+    categories = TestCode.get_categories()
+    filter_states = get_filter_states()
+
+    def load_asset_tables():
+        for category in categories:
+            TestCode.get_asset_table(category)
+
+    def forget_manifests():
+        TestCode.asset_tables.clear()
+        for category in categories:
+            remove_file(TestCode.get_manifest_path(category))
+
+    results["manifest_generate"] = measure(load_asset_tables, args.repeat, forget_manifests)
+    results["manifest_load"] = measure(load_asset_tables, args.repeat, TestCode.asset_tables.clear)
+
+    blend_index_path = os.path.join(thumbnail_folder, cghood_tools.BLEND_INDEX_FILENAME)
+
+    def check_library():
+        return cghood_tools.check_library(library_folder, blend_index_path)
+
+    results["check_library_cold"] = measure(check_library, args.repeat, lambda: remove_file(blend_index_path))
+    results["check_library_cached"] = measure(check_library, args.repeat)
+    results["check_library_cached"]["problems"] = len(check_library()["problems"])
+
+    def build_search_indexes():
+        for category in categories:
+            TestCode.filter_files(category, "", True, True, True, True)
+
+    results["filter_files_index"] = measure(build_search_indexes, args.repeat, TestCode.search_indexes.clear)
+
+    def filter_all_states():
+        for category in categories:
+            for search_str, *season_bools in filter_states:
+                TestCode.filter_files(category, search_str, *season_bools)
+                TestCode.filter_files(category, search_str, *season_bools, rank=True)
+
+    results["filter_files_states"] = measure(filter_all_states, args.repeat)
+
+    def call_for_all_states(function, redraws=1):
+        for category_index in range(len(categories)):
+            my_property._values["category_enum"] = f"category {category_index}"
+            for state in filter_states:
+                set_filter_state(my_property, *state)
+                for _ in range(redraws):
+                    function()
+
+    results["get_iconfiles_cold"] = measure(
+        lambda: call_for_all_states(TestCode.get_iconfiles), args.repeat, TestCode.clear_caches)
+    results["get_iconfiles_redraw"] = measure(
+        lambda: call_for_all_states(TestCode.get_iconfiles, args.redraws), args.repeat, TestCode.clear_caches)
+
+    def load_all_icons():
+        TestCode.load_all_icons()
+        bpy.app.timers.run(args.timeout)
+
+    def release_icons():
+        bpy.app.timers.run(args.timeout)
+        TestCode.release_all_icons()
+
+    results["load_all_icons"] = measure(load_all_icons, args.repeat, release_icons)
+    load_all_icons()
+
+    def asset_callback():
+        TestCode.asset_callback(my_property, bpy.context)
+
+    results["asset_callback_cold"] = measure(
+        lambda: call_for_all_states(asset_callback), args.repeat, TestCode.clear_caches)
+    results["asset_callback_redraw"] = measure(
+        lambda: call_for_all_states(asset_callback, args.redraws), args.repeat, TestCode.clear_caches)
+
+    def update_filters_cascade():
+        for category_index in range(len(categories)):
+            my_property.category_enum = f"category {category_index}"
+            for season in TestCode.seasons:
+                setattr(my_property, f"{season}_bool", False)
+                setattr(my_property, f"{season}_bool", True)
+            for search_str in SEARCH_STRINGS:
+                my_property.search_str = search_str
+            bpy.app.timers.run(args.timeout)
+
+    def page_through_gallery():
+        peak_previews = 0
+        for category_index in range(len(categories)):
+            my_property.category_enum = f"category {category_index}"
+            bpy.app.timers.run(args.timeout)
+            for page in range(1, TestCode.get_page_count(len(TestCode.get_iconfiles()), args.page_size) + 1):
+                my_property.gallery_page = page
+                TestCode.asset_callback(my_property, bpy.context)
+                bpy.app.timers.run(args.timeout)
+                peak_previews = max(peak_previews, len(TestCode.preview_collections[
+                    TestCode.get_preview_key(category_index)]))
+        return peak_previews
+
+    def use_paged_gallery():
+        bpy.app.timers.run(args.timeout)
+        TestCode.release_all_icons()
+        preferences.gallery_page_size = args.page_size
+
+    set_filter_state(my_property, "", True, True, True, True)
+    results["gallery_paging"] = measure(page_through_gallery, args.repeat, use_paged_gallery)
+    results["gallery_paging"]["peak_previews"] = page_through_gallery()
+    preferences.gallery_page_size = 0
+
+    refresh_requests = TestCode.refresh_stats["requests"]
+    refresh_recomputes = TestCode.refresh_stats["recomputes"]
+    results["update_filters_cascade"] = measure(update_filters_cascade, args.repeat, TestCode.clear_caches)
+    results["update_filters_cascade"]["refresh_requests"] = TestCode.refresh_stats["requests"] - refresh_requests
+    results["update_filters_cascade"]["refresh_recomputes"] = TestCode.refresh_stats["recomputes"] - refresh_recomputes
+
+    def poll_library():
+        return TestCode.poll_library_folders(TestCode.get_assetfolder(), {})
+
+    results["watch_poll_idle"] = measure(poll_library, args.repeat)
+    published = itertools.count()
+    icon_folder = os.path.join(library_folder, categories[0], "Iconfiles")
+    source_icon = os.path.join(icon_folder, TestCode.get_category_files(categories[0])[0])
+
+    def publish_assets():
+        bpy.app.timers.run(args.timeout)
+        time.sleep(0.01)
+        for _ in range(20):
+            shutil.copy(source_icon, os.path.join(icon_folder, f"Published{next(published):05d}.jpg"))
+
+    results["watch_apply_changes"] = measure(
+        lambda: TestCode.apply_library_diff(poll_library()), args.repeat, publish_assets)
+
+    def browse_assets():
+        my_property.category_enum = "category 0"
+        for record in TestCode.get_asset_table(categories[0])["records"][:100]:
+            my_property.asset_enum = record.name
+        bpy.app.timers.run(args.timeout)
+
+    results["asset_focus_change"] = measure(browse_assets, args.repeat)
+    TestCode.stop_blend_prefetch()
+
+    bpy.app.timers.run(args.timeout)
+    TestCode.release_all_icons()
+    results["build_preview_atlases"] = measure(
+        lambda: TestCode.CGH_OT_build_preview_atlases().execute(bpy.context), 1)
+    results["load_all_icons_atlas"] = measure(load_all_icons, args.repeat, release_icons)
+
+    blend_folder = os.path.join(library_folder, categories[0], "Blendfiles")
+    blend_path = os.path.join(blend_folder, sorted(os.listdir(blend_folder))[0])
+
+    def place_asset():
+        return TestCode.append_asset_collection(blend_path, os.path.splitext(os.path.basename(blend_path))[0])[0]
+
+    TestCode.merge_snow_groups(TestCode.get_snow_materials(place_asset().all_objects), 0.0)
+    my_property.snow_amount = 0.5
+    results["place_asset_repeat"] = measure(place_asset, args.repeat)
+    results["place_asset_repeat"]["materials"] = len(bpy.data.materials)
+    results["place_asset_repeat"]["unshared_snow_groups"] = sum(
+        1 for material in bpy.data.materials
+        if material.node_tree.nodes["Snow"].node_tree.name != TestCode.SHARED_SNOW_GROUP)
+
+    TestCode.unregister()
+    return results
+
+
+def get_parameters(args):
+    return {
+        "categories": args.categories,
+        "assets": args.assets,
+        "seasons": args.seasons,
+        "thumbnail_size": args.thumbnail_size,
+        "decoy_folders": args.decoy_folders,
+        "repeat": args.repeat,
+        "redraws": args.redraws,
+        "page_size": args.page_size,
+    }
+
+
+def check_results(results):
+    failures = []
+    placement = results["place_asset_repeat"]
+    if placement["materials"] != 1:
+        failures.append(f"Placing one asset {placement['runs'] + 1} times left {placement['materials']} materials")
+    if placement["unshared_snow_groups"]:
+        failures.append(f"{placement['unshared_snow_groups']} placed materials do not use the scene weather")
+    return failures
+
+
+def compare_results(results, baseline, tolerance, min_delta):
+    regressions = []
+    for name, result in sorted(results.items()):
+        reference = baseline["results"].get(name)
+        if reference is None:
+            print(f"{name:28} {result['median'] * 1000:10.2f} ms   (not in baseline)")
+            continue
+        ratio = result["median"] / reference["median"] if reference["median"] else 1.0
+        regressed = ratio > tolerance and result["median"] - reference["median"] > min_delta
+        marker = "REGRESSION" if regressed else ""
+        print(f"{name:28} {result['median'] * 1000:10.2f} ms   baseline {reference['median'] * 1000:10.2f} ms"
+              f"   x{ratio:5.2f} {marker}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def add_new_results(baseline, report):
+    added = [name for name in report["results"] if name not in baseline["results"]]
+    baseline["results"].update((name, report["results"][name]) for name in added)
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the CG Hood add-on under plain CPython with a fake bpy. The baseline timings are "
+                    "recorded on a single host, stored under 'environment' in the baseline, and are only "
+                    "comparable on that host.")
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--assets", type=int, default=500, help="Assets per category")
+    parser.add_argument("--seasons", default=",".join(generate_library.DEFAULT_SEASONS))
+    parser.add_argument("--thumbnail-size", type=int, default=512)
+    parser.add_argument("--decoy-folders", type=int, default=500,
+                        help="Unrelated folders the library search has to walk through")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=50, help="Assets per page in the gallery paging benchmark")
+    parser.add_argument("--redraws", type=int, default=10, help="Calls per filter state in the redraw benchmarks")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for background icon loading")
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Add benchmarks missing from the baseline and keep the recorded ones as they are")
+    parser.add_argument("--replace-baseline", action="store_true",
+                        help="Store all results as a new baseline, e.g. when moving to another host")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="Allowed slowdown ratio against the baseline")
+    parser.add_argument("--min-delta", type=float, default=0.01,
+                        help="Slowdowns smaller than this many seconds are never reported")
+    parser.add_argument("--keep-library", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Show the messages printed by the add-on")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="cghood_benchmark_")
+    try:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+            results = run_benchmarks(args, root)
+    finally:
+        if args.keep_library:
+            print(f"Synthetic library kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "parameters": get_parameters(args),
+        "environment": {"python": platform.python_version(), "machine": platform.machine(),
+                        "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    failures = check_results(results)
+    if failures:
+        print("\n".join(failures))
+        return 1
+    if args.replace_baseline or (args.update_baseline and not os.path.exists(args.baseline)):
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(json.dumps(report, indent=2))
+        print(f"No baseline at {args.baseline}, run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline["parameters"] != report["parameters"]:
+        print(f"Baseline parameters {baseline['parameters']} do not match {report['parameters']}")
+        return 2
+    if baseline["environment"] != report["environment"]:
+        print(f"Baseline was recorded on {baseline['environment']}, this host is {report['environment']}; "
+              f"timings are only comparable on the recording host")
+    if args.update_baseline:
+        added = add_new_results(baseline, report)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2)
+        print(f"Added {', '.join(added) or 'no new benchmarks'} to {args.baseline}")
+        return 0
+    regressions = compare_results(results, baseline, args.tolerance, args.min_delta)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
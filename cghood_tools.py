@@ -0,0 +1,548 @@
+import os
+import re
+import sys
+import gzip
+import json
+import mmap
+import time
+import difflib
+import struct
+import hashlib
+import functools
+import argparse
+import tempfile
+import subprocess
+import concurrent.futures
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+THUMBNAIL_SIZE = 256
+THUMBNAIL_EXTENSION = ".jpg"
+ATLAS_MAGIC = b"CGHATLAS"
+ATLAS_VERSION = 1
+ATLAS_HEADER = struct.Struct("<8sII")
+ATLAS_ALIGNMENT = 16
+BLEND_ID_CODES = {b"GR\0\0": "Collection", b"NT\0\0": "NodeTree", b"MA\0\0": "Material", b"IM\0\0": "Image"}
+BLEND_ID_PREFIX_SIZE = 512
+BLEND_INDEX_FILENAME = ".cgh_blend_index.json"
+BLEND_INDEX_VERSION = 1
+MANIFEST_FILENAME = ".cgh_manifest.json"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def thumbnail_key(source_path, mtime, size, thumbnail_size=THUMBNAIL_SIZE):
+    text = f"{os.path.abspath(source_path)}|{mtime}|{size}|{thumbnail_size}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def thumbnail_path(cache_folder, key):
+    return os.path.join(cache_folder, key[:2], key + THUMBNAIL_EXTENSION)
+
+
+def list_thumbnail_keys(cache_folder):
+    keys = set()
+    if not os.path.isdir(cache_folder):
+        return keys
+    with os.scandir(cache_folder) as buckets:
+        for bucket in buckets:
+            if not bucket.is_dir():
+                continue
+            with os.scandir(bucket.path) as entries:
+                keys.update(entry.name[:-len(THUMBNAIL_EXTENSION)] for entry in entries
+                            if entry.name.endswith(THUMBNAIL_EXTENSION))
+    return keys
+
+
+def fit_size(width, height, thumbnail_size):
+    scale = min(1.0, thumbnail_size / max(width, height, 1))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def build_thumbnail_job(job):
+    source_path, target_path, thumbnail_size = job
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = target_path + f".{os.getpid()}.tmp"
+    try:
+        with Image.open(source_path) as image:
+            image.draft("RGB", (thumbnail_size, thumbnail_size))
+            image = image.convert("RGB")
+            image = image.resize(fit_size(image.width, image.height, thumbnail_size), Image.LANCZOS)
+            image.save(temp_path, "JPEG", quality=90)
+        os.replace(temp_path, target_path)
+    except OSError as error:
+        print(f"CG Hood: could not build a thumbnail for {source_path} ({error})")
+        return None
+    return target_path
+
+
+def can_decode():
+    return Image is not None and numpy is not None
+
+
+def load_preview_image(path, thumbnail_size):
+    try:
+        with Image.open(path) as image:
+            image.draft("RGBA", (thumbnail_size, thumbnail_size))
+            image = image.convert("RGBA")
+    except OSError:
+        return None
+    image.thumbnail((thumbnail_size, thumbnail_size))
+    return image.transpose(Image.FLIP_TOP_BOTTOM)
+
+
+def decode_thumbnail(path, thumbnail_size=THUMBNAIL_SIZE):
+    image = load_preview_image(path, thumbnail_size)
+    if image is None:
+        return None
+    pixels = numpy.frombuffer(image.tobytes(), dtype=numpy.uint8).astype(numpy.float32)
+    pixels *= 1.0 / 255.0
+    return image.size, pixels
+
+
+def atlas_path(cache_folder, category_folder):
+    key = hashlib.sha1(os.path.abspath(category_folder).encode("utf-8")).hexdigest()
+    return os.path.join(cache_folder, "atlases", key + ".atlas")
+
+
+def decode_atlas_entry(job):
+    source_path, thumbnail_size = job
+    image = load_preview_image(source_path, thumbnail_size)
+    if image is None:
+        print(f"CG Hood: could not add {source_path} to the preview atlas")
+        return None
+    return image.width, image.height, image.tobytes()
+
+
+def build_atlas(sources, target_path, thumbnail_size=THUMBNAIL_SIZE, processes=None):
+    if Image is None:
+        print("CG Hood: install Pillow to build preview atlases")
+        return 0
+    processes = processes or os.cpu_count() or 1
+    jobs = [(decode_path, thumbnail_size) for _, _, _, decode_path in sources]
+    chunksize = max(1, len(jobs) // (processes * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        decoded = list(executor.map(decode_atlas_entry, jobs, chunksize=chunksize))
+
+    entries = {}
+    offset = 0
+    for (name, mtime, size, _), result in zip(sources, decoded):
+        if result is not None:
+            width, height, pixels = result
+            entries[name] = [mtime, size, width, height, offset]
+            offset += len(pixels)
+    index = json.dumps({"thumbnail_size": thumbnail_size, "entries": entries}).encode("utf-8")
+    data_offset = -(-(ATLAS_HEADER.size + len(index)) // ATLAS_ALIGNMENT) * ATLAS_ALIGNMENT
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = target_path + f".{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(ATLAS_HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, len(index)))
+        file.write(index)
+        file.write(bytes(data_offset - ATLAS_HEADER.size - len(index)))
+        for result in decoded:
+            if result is not None:
+                file.write(result[2])
+    os.replace(temp_path, target_path)
+    return len(entries)
+
+
+def read_atlas(path):
+    try:
+        with open(path, "rb") as file:
+            magic, version, index_length = ATLAS_HEADER.unpack(file.read(ATLAS_HEADER.size))
+            if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+                return None
+            index = json.loads(file.read(index_length))
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, struct.error):
+        return None
+    index["data_offset"] = -(-(ATLAS_HEADER.size + index_length) // ATLAS_ALIGNMENT) * ATLAS_ALIGNMENT
+    index["buffer"] = memoryview(buffer)
+    return index
+
+
+def get_atlas_pixels(atlas, entry):
+    _, _, width, height, offset = entry
+    start = atlas["data_offset"] + offset
+    return atlas["buffer"][start:start + width * height * 4].cast("i")
+
+
+def open_blend_file(path):
+    with open(path, "rb") as file:
+        magic = file.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, "rb")
+    if magic == ZSTD_MAGIC:
+        if zstd is not None:
+            return zstd.open(path, "rb")
+        if zstandard is not None:
+            return zstandard.open(path, "rb")
+        raise ValueError("zstd compressed, install zstandard to read it")
+    return open(path, "rb")
+
+
+def skip_bytes(file, length):
+    if file.seekable():
+        file.seek(length, os.SEEK_CUR)
+        return
+    while length > 0:
+        chunk = file.read(min(length, 1024 * 1024))
+        if not chunk:
+            raise ValueError("truncated file")
+        length -= len(chunk)
+
+
+def read_blend_header(file):
+    header = file.read(12)
+    if not header.startswith(b"BLENDER"):
+        raise ValueError("not a .blend file")
+    if header[7:9].isdigit():
+        header += file.read(int(header[7:9]) - len(header))
+        if header[10:12] != b"01":
+            raise ValueError(f"unsupported file format {header[10:12].decode('ascii', 'replace')}")
+        order = "<" if header[12:13] == b"v" else ">"
+        return header[13:17].decode("ascii"), order, 8, struct.Struct(order + "4siQqq"), 3
+    pointer_size = 8 if header[7:8] == b"-" else 4
+    order = "<" if header[8:9] == b"v" else ">"
+    bhead = struct.Struct(order + "4si" + ("Q" if pointer_size == 8 else "I") + "ii")
+    return header[9:12].decode("ascii"), order, pointer_size, bhead, 1
+
+
+def get_dna_field_size(name, type_length, pointer_size):
+    size = pointer_size if name.startswith(("*", "(*")) else type_length
+    for dimension in re.findall(r"\[(\d+)\]", name):
+        size *= int(dimension)
+    return size
+
+
+def read_dna_strings(dna, position, tag, order):
+    if dna[position:position + 4] != tag:
+        raise ValueError("corrupt DNA")
+    count = struct.unpack_from(order + "i", dna, position + 4)[0]
+    position += 8
+    strings = []
+    for _ in range(count):
+        end = dna.index(b"\0", position)
+        strings.append(dna[position:end].decode("latin-1"))
+        position = end + 1
+    return strings, (position + 3) & ~3
+
+
+def get_id_name_field(dna, order, pointer_size):
+    if dna[:4] != b"SDNA":
+        raise ValueError("corrupt DNA")
+    names, position = read_dna_strings(dna, 4, b"NAME", order)
+    types, position = read_dna_strings(dna, position, b"TYPE", order)
+    if dna[position:position + 4] != b"TLEN":
+        raise ValueError("corrupt DNA")
+    lengths = struct.unpack_from(f"{order}{len(types)}h", dna, position + 4)
+    position = (position + 4 + 2 * len(types) + 3) & ~3
+    if dna[position:position + 4] != b"STRC":
+        raise ValueError("corrupt DNA")
+    count = struct.unpack_from(order + "i", dna, position + 4)[0]
+    position += 8
+    for _ in range(count):
+        type_index, field_count = struct.unpack_from(order + "hh", dna, position)
+        fields = struct.unpack_from(f"{order}{2 * field_count}h", dna, position + 4)
+        position += 4 + 4 * field_count
+        if types[type_index] != "ID":
+            continue
+        offset = 0
+        for field_type, field_name in zip(fields[::2], fields[1::2]):
+            name = names[field_name]
+            size = get_dna_field_size(name, lengths[field_type], pointer_size)
+            if name.split("[")[0] == "name":
+                return offset, size
+            offset += size
+    raise ValueError("no ID name in DNA")
+
+
+def read_blend_ids(path):
+    with open_blend_file(path) as file:
+        version, order, pointer_size, bhead, length_index = read_blend_header(file)
+        prefixes = []
+        dna = None
+        while True:
+            data = file.read(bhead.size)
+            if len(data) < bhead.size:
+                raise ValueError("truncated file")
+            fields = bhead.unpack(data)
+            code, length = fields[0], fields[length_index]
+            if code == b"ENDB":
+                break
+            if code == b"DNA1":
+                dna = file.read(length)
+            elif code in BLEND_ID_CODES:
+                prefix = file.read(min(length, BLEND_ID_PREFIX_SIZE))
+                prefixes.append((code, prefix))
+                skip_bytes(file, length - len(prefix))
+            else:
+                skip_bytes(file, length)
+    if dna is None:
+        raise ValueError("no DNA block")
+    name_offset, name_size = get_id_name_field(dna, order, pointer_size)
+    ids = {type_name: [] for type_name in BLEND_ID_CODES.values()}
+    for code, prefix in prefixes:
+        name = prefix[name_offset + 2:name_offset + name_size].split(b"\0", 1)[0]
+        ids[BLEND_ID_CODES[code]].append(name.decode("utf-8", "replace"))
+    return {"version": version, "ids": ids}
+
+
+def index_blend_file(path):
+    try:
+        return read_blend_ids(path)
+    except Exception as error:
+        return {"error": str(error) or type(error).__name__}
+
+
+def build_thumbnails_with_bpy(jobs):
+    import bpy
+    built = []
+    for source_path, target_path, thumbnail_size in jobs:
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        try:
+            image = bpy.data.images.load(source_path)
+        except RuntimeError as error:
+            print(f"CG Hood: could not build a thumbnail for {source_path} ({error})")
+            continue
+        image.scale(*fit_size(image.size[0], image.size[1], thumbnail_size))
+        image.filepath_raw = target_path
+        image.file_format = 'JPEG'
+        image.save()
+        bpy.data.images.remove(image)
+        built.append(target_path)
+    return built
+
+
+def run_blender_chunk(blender, jobs):
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+        json.dump(jobs, file)
+    try:
+        subprocess.run(
+            [blender, "--background", "--factory-startup", "--python", os.path.abspath(__file__),
+             "--", "build-chunk", file.name],
+            stdout=subprocess.DEVNULL, check=False)
+    finally:
+        os.remove(file.name)
+    return [target_path for _, target_path, _ in jobs if os.path.exists(target_path)]
+
+
+def build_thumbnails(jobs, processes=None, blender=None):
+    jobs = [tuple(job) for job in jobs]
+    if not jobs:
+        return []
+    processes = processes or os.cpu_count() or 1
+    if Image is not None:
+        chunksize = max(1, len(jobs) // (processes * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            return [path for path in executor.map(build_thumbnail_job, jobs, chunksize=chunksize) if path]
+    if blender:
+        chunks = [jobs[i::processes] for i in range(min(processes, len(jobs)))]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            return [path for paths in executor.map(functools.partial(run_blender_chunk, blender), chunks)
+                    for path in paths]
+    print("CG Hood: install Pillow or pass the Blender executable to build thumbnails")
+    return []
+
+
+def iter_library_icons(library_folder):
+    for category in sorted(os.listdir(library_folder)):
+        icon_folder = os.path.join(library_folder, category, "Iconfiles")
+        if category.startswith(".") or not os.path.isdir(icon_folder):
+            continue
+        with os.scandir(icon_folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".jpg") and entry.is_file():
+                    yield category, entry.path, entry.stat()
+
+
+def atlas_sources(category_folder, cache_folder, thumbnail_size=THUMBNAIL_SIZE):
+    existing_keys = list_thumbnail_keys(cache_folder)
+    sources = []
+    icon_folder = os.path.join(category_folder, "Iconfiles")
+    with os.scandir(icon_folder) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if not entry.name.endswith(".jpg") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            key = thumbnail_key(entry.path, stat.st_mtime, stat.st_size, thumbnail_size)
+            decode_path = thumbnail_path(cache_folder, key) if key in existing_keys else entry.path
+            sources.append((entry.name, stat.st_mtime, stat.st_size, decode_path))
+    return sources
+
+
+def thumbnail_jobs(library_folder, cache_folder, thumbnail_size=THUMBNAIL_SIZE):
+    existing_keys = list_thumbnail_keys(cache_folder)
+    jobs = []
+    for _, source_path, stat in iter_library_icons(library_folder):
+        key = thumbnail_key(source_path, stat.st_mtime, stat.st_size, thumbnail_size)
+        if key not in existing_keys:
+            jobs.append((source_path, thumbnail_path(cache_folder, key), thumbnail_size))
+    return jobs
+
+
+def read_blend_index(cache_path):
+    try:
+        with open(cache_path, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return cache.get("entries", {}) if cache.get("version") == BLEND_INDEX_VERSION else {}
+
+
+def build_blend_index(paths, cache_path=None, processes=None):
+    entries = read_blend_index(cache_path) if cache_path else {}
+    stats = {}
+    for path in paths:
+        try:
+            stats[path] = os.stat(path)
+        except OSError:
+            continue
+    stale = [path for path, stat in stats.items()
+             if entries.get(path, {}).get("mtime") != stat.st_mtime or entries[path].get("size") != stat.st_size]
+    if stale:
+        processes = processes or os.cpu_count() or 1
+        chunksize = max(1, len(stale) // (processes * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            for path, entry in zip(stale, executor.map(index_blend_file, stale, chunksize=chunksize)):
+                entry.update(mtime=stats[path].st_mtime, size=stats[path].st_size)
+                entries[path] = entry
+    if cache_path and stale:
+        temp_path = cache_path + f".{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": BLEND_INDEX_VERSION, "entries": entries}, file, separators=(",", ":"))
+            os.replace(temp_path, cache_path)
+        except OSError as error:
+            print(f"CG Hood: could not save the .blend index ({error})")
+    return {path: entries[path] for path in stats}, len(stale)
+
+
+def library_assets(category_folder):
+    try:
+        with open(os.path.join(category_folder, MANIFEST_FILENAME), "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        rows = [dict(zip(manifest["fields"], row)) for row in manifest["assets"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        icon_folder = os.path.join(category_folder, "Iconfiles")
+        names = sorted(os.path.splitext(name)[0] for name in os.listdir(icon_folder)
+                       if name.endswith(".jpg")) if os.path.isdir(icon_folder) else []
+        rows = [{"name": name} for name in names]
+    for row in rows:
+        name = row["name"]
+        blend = row.get("blend") or f"Blendfiles/{name}.blend"
+        yield name, os.path.normpath(os.path.join(category_folder, blend)), row.get("collection") or name
+
+
+def check_library(library_folder, cache_path=None, processes=None):
+    assets = []
+    for category in sorted(os.listdir(library_folder)):
+        category_folder = os.path.join(library_folder, category)
+        if category.startswith(".") or not os.path.isdir(category_folder):
+            continue
+        assets.extend((category, name, blend_path, collection)
+                      for name, blend_path, collection in library_assets(category_folder))
+    blend_paths = sorted({blend_path for _, _, blend_path, _ in assets})
+    index, parsed = build_blend_index(blend_paths, cache_path, processes)
+    problems = []
+    for category, name, blend_path, collection in assets:
+        entry = index.get(blend_path)
+        relative_path = os.path.relpath(blend_path, library_folder)
+        if entry is None:
+            problems.append((category, name, "missing", f"{relative_path} does not exist"))
+        elif "error" in entry:
+            problems.append((category, name, "unreadable", f"{relative_path}: {entry['error']}"))
+        elif collection not in entry["ids"]["Collection"]:
+            close_matches = difflib.get_close_matches(collection, entry["ids"]["Collection"], 3)
+            problems.append((category, name, "mismatch",
+                             f"no collection \"{collection}\" in {relative_path}"
+                             + (f", did you mean {', '.join(close_matches)}?" if close_matches else "")))
+    return {"assets": len(assets), "files": len(index), "parsed": parsed, "problems": problems}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CG Hood library tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    thumbnails = commands.add_parser("thumbnails", help="Warm the downscaled thumbnail cache")
+    thumbnails.add_argument("library", help="Path of the CG Hood/TEST folder")
+    thumbnails.add_argument("cache", help="Thumbnail cache folder")
+    thumbnails.add_argument("--size", type=int, default=THUMBNAIL_SIZE)
+    thumbnails.add_argument("--jobs", type=int, default=None)
+    thumbnails.add_argument("--blender", default=None, help="Blender executable used when Pillow is missing")
+
+    atlases = commands.add_parser("atlases", help="Pack the previews of every category into memory-mapped atlases")
+    atlases.add_argument("library", help="Path of the CG Hood/TEST folder")
+    atlases.add_argument("cache", help="Thumbnail cache folder")
+    atlases.add_argument("--size", type=int, default=THUMBNAIL_SIZE)
+    atlases.add_argument("--jobs", type=int, default=None)
+
+    check = commands.add_parser("check", help="Check that the .blend of every asset exists and holds its collection")
+    check.add_argument("library", help="Path of the CG Hood/TEST folder")
+    check.add_argument("--cache", default=None, help=f"Index cache file, {BLEND_INDEX_FILENAME} in the library by default")
+    check.add_argument("--jobs", type=int, default=None)
+    check.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    ids = commands.add_parser("ids", help="List the collections, node trees, materials and images of .blend files")
+    ids.add_argument("files", nargs="+")
+
+    chunk = commands.add_parser("build-chunk")
+    chunk.add_argument("jobs_file")
+
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    args = parser.parse_args(argv)
+
+    if args.command == "build-chunk":
+        with open(args.jobs_file, "r", encoding="utf-8") as file:
+            build_thumbnails_with_bpy(json.load(file))
+    elif args.command == "thumbnails":
+        jobs = thumbnail_jobs(args.library, args.cache, args.size)
+        built = build_thumbnails(jobs, args.jobs, args.blender)
+        print(f"{len(built)} of {len(jobs)} missing thumbnails built")
+    elif args.command == "atlases":
+        for category in sorted(os.listdir(args.library)):
+            category_folder = os.path.join(args.library, category)
+            if category.startswith(".") or not os.path.isdir(os.path.join(category_folder, "Iconfiles")):
+                continue
+            sources = atlas_sources(category_folder, args.cache, args.size)
+            count = build_atlas(sources, atlas_path(args.cache, category_folder), args.size, args.jobs)
+            print(f"{category}: {count} of {len(sources)} previews packed")
+    elif args.command == "check":
+        start_time = time.perf_counter()
+        report = check_library(args.library, args.cache or os.path.join(args.library, BLEND_INDEX_FILENAME), args.jobs)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            for category, name, kind, message in report["problems"]:
+                print(f"{category}/{name}: {kind}: {message}")
+            print(f"{report['assets']} assets, {report['files']} .blend files ({report['parsed']} read) checked in "
+                  f"{time.perf_counter() - start_time:.1f}s, {len(report['problems'])} problems")
+        return 1 if report["problems"] else 0
+    elif args.command == "ids":
+        print(json.dumps({path: index_blend_file(path) for path in args.files}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())